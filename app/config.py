@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
 from dotenv import load_dotenv
 
@@ -16,11 +16,72 @@ def _parse_ids(value: str) -> list[int]:
             pass
     return ids
 
+def _parse_windows(value: str) -> dict[int, int]:
+    """ "123:60, 456:0" -> {123: 60, 456: 0} """
+    out: dict[int, int] = {}
+    for item in (value or "").replace(",", " ").split():
+        chat, _, sec = item.partition(":")
+        try:
+            out[int(chat)] = int(sec)
+        except ValueError:
+            pass
+    return out
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip() or default)
+    except ValueError:
+        return default
+
+def _parse_state_ttls(value: str) -> dict[str, int]:
+    """ "MoveStates=3600, PointCorrectionStates:waiting_photo=900" -> {стан або група: сек} """
+    out: dict[str, int] = {}
+    for item in (value or "").replace(",", " ").split():
+        name, _, sec = item.rpartition("=")
+        try:
+            if name:
+                out[name] = int(sec)
+        except ValueError:
+            pass
+    return out
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
 @dataclass(frozen=True)
 class Config:
     bot_token: str
     admins: list[int]
     db_path: str
+    fanout_concurrency: int = 8
+    update_concurrency: int = 64   # скільки апдейтів (з різних чатів) обробляються одночасно
+    workers: int = 1               # >1 — supervisor + N процесів-воркерів (шардування по chat_id)
+    # "copy": пакет накладної шлемо один раз і копіюємо (copy_messages), "upload": кожному окремо
+    delivery_mode: str = "copy"
+    delivery_staging_chat_id: int | None = None
+    # зведення подій Віддав/Отримав/Закрито для оператора: вікно в секундах (0 — вимкнено)
+    digest_window: int = 0
+    digest_windows: dict[int, int] = field(default_factory=dict)
+    # "polling" або "webhook" (вбудований aiohttp-сервер)
+    run_mode: str = "polling"
+    webhook_url: str = ""          # публічна база, напр. https://bot.example.com (порожньо — setWebhook не робимо)
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_secret: str = ""       # X-Telegram-Bot-Api-Secret-Token
+    webhook_background: bool = True
+    # FSM storage: "memory" (в процесі, LRU + TTL) або "pg" (спільний для інстансів, переживає рестарт)
+    fsm_storage: str = "memory"
+    fsm_ttl: int = 24 * 3600   # покинутий майстер видаляється через стільки секунд без змін
+    fsm_state_ttls: dict[str, int] = field(default_factory=dict)   # TTL для окремих станів/груп (memory)
+    fsm_max_entries: int = 10_000                                   # ліміт записів (memory)
+    # LISTEN/NOTIFY: скидати кеші довідника/прив’язок, коли дані міняє інший інстанс
+    cache_listen: bool = True
+    moves_page_size: int = 20      # рядків на сторінку в списках переміщень
+    metrics_interval: int = 300    # як часто писати метрики в лог, сек (0 — вимкнено)
 
     @property
     def admins_set(self) -> set[int]:
@@ -38,4 +99,25 @@ def load_config() -> Config:
         bot_token=token,
         admins=admins,
         db_path=db_path,
+        fanout_concurrency=max(1, _env_int("FANOUT_CONCURRENCY", 8)),
+        update_concurrency=max(1, _env_int("UPDATE_CONCURRENCY", 64)),
+        workers=max(1, _env_int("WORKERS", 1)),
+        delivery_mode=(os.getenv("DELIVERY_MODE", "copy").strip().lower() or "copy"),
+        delivery_staging_chat_id=_env_int("DELIVERY_STAGING_CHAT_ID", 0) or None,
+        digest_window=max(0, _env_int("DIGEST_WINDOW", 0)),
+        digest_windows=_parse_windows(os.getenv("DIGEST_WINDOWS", "")),
+        run_mode=(os.getenv("RUN_MODE", "polling").strip().lower() or "polling"),
+        webhook_url=os.getenv("WEBHOOK_URL", "").strip().rstrip("/"),
+        webhook_path="/" + (os.getenv("WEBHOOK_PATH", "").strip().strip("/") or "webhook"),
+        webhook_host=os.getenv("WEBHOOK_HOST", "").strip() or "0.0.0.0",
+        webhook_port=_env_int("WEBHOOK_PORT", 8080),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "").strip(),
+        webhook_background=_env_bool("WEBHOOK_BACKGROUND", True),
+        fsm_storage=(os.getenv("FSM_STORAGE", "memory").strip().lower() or "memory"),
+        fsm_ttl=_env_int("FSM_TTL", 24 * 3600),
+        fsm_state_ttls=_parse_state_ttls(os.getenv("FSM_STATE_TTLS", "")),
+        fsm_max_entries=max(1, _env_int("FSM_MAX_ENTRIES", 10_000)),
+        cache_listen=_env_bool("CACHE_LISTEN", True),
+        moves_page_size=min(90, max(1, _env_int("MOVES_PAGE_SIZE", 20))),
+        metrics_interval=max(0, _env_int("METRICS_INTERVAL", 300)),
     )
@@ -1,3 +1,3 @@
-from .pg_schema import ensure_schema
+from .pg_schema import ensure_schema, migrate
 
-__all__ = ("ensure_schema",)
+__all__ = ("ensure_schema", "migrate")
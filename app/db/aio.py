@@ -0,0 +1,160 @@
+# app/db/aio.py
+"""
+Awaitable-обгортки над синхронними repo (psycopg2).
+
+Кожен виклик виконується в окремому обмеженому пулі потоків, розмір якого
+дорівнює DB_POOL_MAX, тож потоки не чекають одне одного на зʼєднання, а
+event loop aiogram не блокується повільним запитом.
+Очікування в черзі і час запитів — executor.stats() по кожному виклику,
+executor.summary() — зведення, яке періодично пише в лог MetricsReporter.
+
+Використання в хендлерах:
+    from ..db.aio import moves_repo as mv_repo
+    m = await mv_repo.get_move(move_id)
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import ModuleType
+
+from . import auth_repo as _auth_repo
+from . import fsm_repo as _fsm_repo
+from . import locations_repo as _locations_repo
+from . import moves_repo as _moves_repo
+from . import outbox_repo as _outbox_repo
+from .pg import pool_limits
+
+log = logging.getLogger(__name__)
+
+# якщо виклик чекав у черзі довше — пишемо warning (пул замалий під навантаження)
+SLOW_QUEUE_WAIT = 0.5
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    run_total: float = 0.0
+    run_max: float = 0.0
+
+    @property
+    def queue_wait_avg(self) -> float:
+        return self.queue_wait_total / self.calls if self.calls else 0.0
+
+
+class DbExecutor:
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._stats: dict[str, CallStats] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Скільки викликів зараз у черзі або виконується."""
+        return self._pending
+
+    def _record(self, name: str, queue_wait: float, run: float, failed: bool) -> None:
+        with self._lock:
+            st = self._stats.setdefault(name, CallStats())
+            st.calls += 1
+            st.errors += int(failed)
+            st.queue_wait_total += queue_wait
+            st.queue_wait_max = max(st.queue_wait_max, queue_wait)
+            st.run_total += run
+            st.run_max = max(st.run_max, run)
+
+        if queue_wait > SLOW_QUEUE_WAIT:
+            log.warning("DB call %s waited %.3fs in queue (pending=%s)", name, queue_wait, self._pending)
+
+    async def run(self, name: str, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def _call():
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self._record(name, started - submitted, time.perf_counter() - started, failed)
+
+        self._pending += 1
+        try:
+            return await loop.run_in_executor(self._executor, _call)
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict[str, CallStats]:
+        with self._lock:
+            return {k: CallStats(**vars(v)) for k, v in self._stats.items()}
+
+    def summary(self) -> dict[str, float | str]:
+        """Зведення по всіх викликах (для MetricsReporter) + найдовше очікування в черзі."""
+        per_call = self.stats()
+        total = CallStats()
+        for st in per_call.values():
+            total.calls += st.calls
+            total.errors += st.errors
+            total.queue_wait_total += st.queue_wait_total
+            total.queue_wait_max = max(total.queue_wait_max, st.queue_wait_max)
+            total.run_total += st.run_total
+            total.run_max = max(total.run_max, st.run_max)
+        worst = max(per_call, key=lambda k: per_call[k].queue_wait_max, default="")
+        return {
+            "pending": self._pending,
+            "calls": total.calls,
+            "errors": total.errors,
+            "queue_wait_avg": round(total.queue_wait_avg, 4),
+            "queue_wait_max": round(total.queue_wait_max, 4),
+            "run_avg": round(total.run_total / total.calls, 4) if total.calls else 0.0,
+            "run_max": round(total.run_max, 4),
+            "worst_wait_call": worst,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+executor = DbExecutor(max_workers=pool_limits()[1])
+
+
+class AsyncRepo:
+    """Проксі над repo-модулем: кожна публічна функція стає корутиною."""
+
+    def __init__(self, module: ModuleType):
+        self._name = module.__name__.rsplit(".", 1)[-1]
+        for attr, fn in inspect.getmembers(module, inspect.isfunction):
+            if attr.startswith("_") or fn.__module__ != module.__name__:
+                continue
+            setattr(self, attr, self._wrap(f"{self._name}.{attr}", fn))
+
+    @staticmethod
+    def _wrap(name: str, fn):
+        async def call(*args, **kwargs):
+            return await executor.run(name, fn, *args, **kwargs)
+
+        call.__name__ = fn.__name__
+        call.__qualname__ = name
+        call.__doc__ = fn.__doc__
+        return call
+
+    def __repr__(self) -> str:
+        return f"<AsyncRepo {self._name}>"
+
+
+moves_repo = AsyncRepo(_moves_repo)
+auth_repo = AsyncRepo(_auth_repo)
+locations_repo = AsyncRepo(_locations_repo)
+outbox_repo = AsyncRepo(_outbox_repo)
+fsm_repo = AsyncRepo(_fsm_repo)
+
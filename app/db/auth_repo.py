@@ -1,9 +1,8 @@
-from .pg_schema import ensure_schema
+from .membership import membership
 from .pg import get_cur
 
 
 def upsert_user(telegram_id: int, username: str | None, full_name: str | None, role: str = "point") -> None:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute(
             """
@@ -19,9 +18,10 @@ def upsert_user(telegram_id: int, username: str | None, full_name: str | None, r
 
 
 def link_user_to_point(telegram_id: int, point_id: int, username: str | None, full_name: str | None) -> None:
-    ensure_schema()
     upsert_user(telegram_id, username, full_name, "point")
     with get_cur() as cur:
+        cur.execute("SELECT point_id FROM point_users WHERE telegram_id=%s", (telegram_id,))
+        old = cur.fetchone()
         cur.execute(
             """
             INSERT INTO point_users(telegram_id, point_id)
@@ -30,18 +30,22 @@ def link_user_to_point(telegram_id: int, point_id: int, username: str | None, fu
             """,
             (telegram_id, point_id),
         )
+    membership.invalidate_user(telegram_id)
+    membership.invalidate_point(point_id)
+    if old:
+        membership.invalidate_point(old["point_id"])
 
 
 def get_user_point_id(telegram_id: int) -> int | None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute("SELECT point_id FROM point_users WHERE telegram_id=%s", (telegram_id,))
-        row = cur.fetchone()
-        return int(row["point_id"]) if row else None
+    return membership.user_point(telegram_id)
+
+
+def get_point_recipients(point_id: int) -> list[int]:
+    """telegram_id-и прив’язаних до ТТ (новіші першими) — з кешу membership."""
+    return membership.point_recipients(point_id)
 
 
 def get_point_users(point_id: int) -> list[dict]:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute(
             """
@@ -57,8 +61,11 @@ def get_point_users(point_id: int) -> list[dict]:
 
 
 def unlink_user(telegram_id: int) -> bool:
-    ensure_schema()
     with get_cur() as cur:
-        cur.execute("DELETE FROM point_users WHERE telegram_id=%s", (telegram_id,))
-        return cur.rowcount > 0
+        cur.execute("DELETE FROM point_users WHERE telegram_id=%s RETURNING point_id", (telegram_id,))
+        rows = cur.fetchall()
+    membership.invalidate_user(telegram_id)
+    for r in rows:
+        membership.invalidate_point(r["point_id"])
+    return len(rows) > 0
 
@@ -0,0 +1,98 @@
+# app/db/directory.py
+"""
+Довідник міст і ТТ у памʼяті процесу.
+
+Міста/ТТ читаються майже на кожному екрані меню, а змінюються кілька разів
+на місяць — тож тримаємо знімок (компактні __slots__-записи + індекси) і
+перечитуємо його тільки після змін (invalidate() з locations_repo) або
+раз на MAX_AGE як страховку (інші інстанси бота теж можуть змінити дані).
+
+Знімок незмінний і підміняється атомарно — читати можна з будь-якого потоку
+пулу БД без блокувань. Покоління і підміна знімка — під self._lock (короткий,
+без запитів у БД); _reload_lock лише не дає кільком потокам перечитувати разом.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from .pg import get_cur
+
+log = logging.getLogger(__name__)
+
+MAX_AGE = 600.0
+
+
+class City:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+
+class Point:
+    __slots__ = ("id", "city_id", "name")
+
+    def __init__(self, id: int, city_id: int, name: str):
+        self.id = id
+        self.city_id = city_id
+        self.name = name
+
+
+class Snapshot:
+    __slots__ = ("cities", "city_by_id", "city_by_name", "point_by_id", "points_by_city", "loaded_at")
+
+    def __init__(self, cities: list[City], points: list[Point]):
+        self.cities = cities                                    # ORDER BY name
+        self.city_by_id = {c.id: c for c in cities}
+        self.city_by_name = {c.name.lower(): c for c in cities}
+        self.point_by_id = {p.id: p for p in points}
+        self.points_by_city: dict[int, list[Point]] = {}
+        for p in points:                                        # ORDER BY name
+            self.points_by_city.setdefault(p.city_id, []).append(p)
+        self.loaded_at = time.monotonic()
+
+
+class Directory:
+    def __init__(self, max_age: float = MAX_AGE):
+        self.max_age = max_age
+        self._snapshot: Optional[Snapshot] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def snapshot(self) -> Snapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - snap.loaded_at < self.max_age:
+            return snap
+        with self._reload_lock:
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - snap.loaded_at < self.max_age:
+                return snap
+            return self.reload()
+
+    def reload(self) -> Snapshot:
+        with self._lock:
+            generation = self._generation
+        with get_cur() as cur:
+            cur.execute("SELECT id, name FROM cities ORDER BY name")
+            cities = [City(r["id"], r["name"]) for r in cur.fetchall()]
+            cur.execute("SELECT id, city_id, name FROM points ORDER BY name")
+            points = [Point(r["id"], r["city_id"], r["name"]) for r in cur.fetchall()]
+
+        snap = Snapshot(cities, points)
+        with self._lock:
+            # якщо поки читали був invalidate — знімок уже застарів, не кешуємо його
+            if generation == self._generation:
+                self._snapshot = snap
+        log.info("Directory loaded: cities=%s points=%s", len(cities), len(points))
+        return snap
+
+
+directory = Directory()
@@ -0,0 +1,64 @@
+# app/db/fsm_repo.py
+from typing import Optional, Dict
+
+from psycopg2.extras import Json
+
+from .pg import get_cur, get_tx
+
+# (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+FsmKey = tuple[int, int, int, int, str, str]
+
+_KEY_WHERE = """
+    bot_id=%s AND chat_id=%s AND user_id=%s
+    AND thread_id=%s AND business_connection_id=%s AND destiny=%s
+"""
+
+
+def load(key: FsmKey) -> Optional[Dict]:
+    """{"state", "data"} або None (нема / протерміновано)."""
+    with get_cur() as cur:
+        cur.execute(
+            "SELECT state, data FROM fsm_state WHERE " + _KEY_WHERE
+            + " AND (expires_at IS NULL OR expires_at > NOW())",
+            key,
+        )
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+
+def save(key: FsmKey, field: str, value, ttl_seconds: int) -> None:
+    """
+    Write-through одного поля ("state" або "data") однією транзакцією.
+    Друге поле лишається як є (якщо рядок протермінований — скидається до порожнього).
+    Рядок без стану і без даних видаляємо. ttl_seconds <= 0 — без терміну.
+    """
+    if field not in ("state", "data"):
+        raise ValueError(f"fsm_repo.save: unknown field {field!r}")
+    other = "data" if field == "state" else "state"
+    ttl = ttl_seconds if ttl_seconds > 0 else None
+    with get_tx() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO fsm_state(
+                bot_id, chat_id, user_id, thread_id, business_connection_id, destiny,
+                {field}, updated_at, expires_at
+            )
+            VALUES(%s, %s, %s, %s, %s, %s, %s, NOW(), NOW() + make_interval(secs => %s))
+            ON CONFLICT (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+            DO UPDATE SET {field}=EXCLUDED.{field},
+                          {other}=CASE WHEN fsm_state.expires_at <= NOW()
+                                       THEN EXCLUDED.{other} ELSE fsm_state.{other} END,
+                          updated_at=NOW(), expires_at=EXCLUDED.expires_at
+            """,
+            (*key, Json(value) if field == "data" else value, ttl),
+        )
+        cur.execute(
+            "DELETE FROM fsm_state WHERE " + _KEY_WHERE + " AND state IS NULL AND data = '{}'::jsonb",
+            key,
+        )
+
+
+def purge_expired() -> int:
+    with get_cur() as cur:
+        cur.execute("DELETE FROM fsm_state WHERE expires_at IS NOT NULL AND expires_at <= NOW()")
+        return cur.rowcount or 0
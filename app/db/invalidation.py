@@ -0,0 +1,181 @@
+# app/db/invalidation.py
+"""
+Скидання кешів процесу по Postgres LISTEN/NOTIFY (кілька інстансів бота).
+
+Тригери (міграції 0006, 0009) на cities / points / point_users шлють
+NOTIFY cache_invalidate '<таблиця>:<ключ>'. CacheListener тримає окреме
+зʼєднання (не з пулу) з LISTEN, читає сповіщення через loop.add_reader і
+викликає підписані обробники:
+
+    subscribe("points", lambda key: ...)   # key — "id" / "telegram_id:point_id", None — "скинь усе"
+
+Поки зʼєднання не було (старт, обрив) сповіщення губляться, тож після
+кожного (пере)підключення всі обробники отримують key=None.
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+
+import psycopg2
+
+from .directory import directory
+from .membership import membership
+from .pg import get_database_url
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidate"
+RECONNECT_DELAY = 5.0
+KEEPALIVE = 60.0
+
+Handler = Callable[[Optional[str]], None]
+
+_handlers: dict[str, list[Handler]] = {}
+
+
+def subscribe(table: str, handler: Handler) -> None:
+    _handlers.setdefault(table, []).append(handler)
+
+
+def dispatch(payload: Optional[str]) -> None:
+    """payload "<таблиця>:<ключ>" -> обробники таблиці; None -> всі обробники з key=None."""
+    if payload is None:
+        targets = [(h, None) for hs in _handlers.values() for h in hs]
+    else:
+        table, _, key = payload.partition(":")
+        targets = [(h, key) for h in _handlers.get(table, ())]
+    for handler, key in targets:
+        try:
+            handler(key)
+        except Exception:
+            log.exception("Cache invalidation handler failed: %s", payload)
+
+
+# ---------- кеші цього процесу ----------
+def _on_directory(key: Optional[str]) -> None:
+    directory.invalidate()
+
+
+def _on_point_users(key: Optional[str]) -> None:
+    if key is None:
+        membership.clear()
+        return
+    telegram_id, _, point_id = key.partition(":")
+    membership.invalidate_user(int(telegram_id))
+    membership.invalidate_point(int(point_id))
+
+
+subscribe("cities", _on_directory)
+subscribe("points", _on_directory)
+subscribe("point_users", _on_point_users)
+
+
+# ---------- listener ----------
+class CacheListener:
+    def __init__(self):
+        self._conn = None
+        self._task: asyncio.Task | None = None
+        self._lost: asyncio.Event | None = None
+        # метрики
+        self.received = 0
+        self.reconnects = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"connected": int(self._conn is not None), "received": self.received, "reconnects": self.reconnects}
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="cache-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    def _connect():
+        conn = psycopg2.connect(get_database_url())
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL};")
+        return conn
+
+    @staticmethod
+    def _ping(conn) -> None:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+
+    def _on_readable(self) -> None:
+        conn = self._conn
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            log.warning("Cache listener connection lost: %s", e)
+            self._lost.set()
+            return
+        self._drain()
+
+    def _drain(self) -> None:
+        conn = self._conn
+        while conn.notifies:
+            self.received += 1
+            dispatch(conn.notifies.pop(0).payload)
+
+    def _close(self, loop: asyncio.AbstractEventLoop) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            loop.remove_reader(conn.fileno())
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._lost = asyncio.Event()
+        try:
+            while True:
+                try:
+                    self._conn = await loop.run_in_executor(None, self._connect)
+                except Exception as e:
+                    log.warning("Cache listener connect failed: %s", e)
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+
+                self._lost.clear()
+                loop.add_reader(self._conn.fileno(), self._on_readable)
+                # поки не слухали, могли пропустити зміни
+                dispatch(None)
+                log.info("Cache listener: LISTEN %s", CHANNEL)
+
+                while not self._lost.is_set():
+                    try:
+                        await asyncio.wait_for(self._lost.wait(), KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        # тихо обірване TCP-зʼєднання інакше не помітимо; на час пінгу
+                        # зʼєднання належить потоку пулу, сповіщення, що прийшли разом
+                        # з відповіддю, розбираємо після
+                        fd = self._conn.fileno()
+                        loop.remove_reader(fd)
+                        try:
+                            await loop.run_in_executor(None, self._ping, self._conn)
+                        except psycopg2.Error as e:
+                            log.warning("Cache listener ping failed: %s", e)
+                            self._lost.set()
+                        else:
+                            loop.add_reader(fd, self._on_readable)
+                            self._drain()
+
+                self._close(loop)
+                self.reconnects += 1
+                await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            self._close(loop)
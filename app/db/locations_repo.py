@@ -1,67 +1,127 @@
-from .pg_schema import ensure_schema
+from .directory import directory
+from .membership import membership
 from .pg import get_cur
 
 
 def list_cities():
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute("SELECT id, name FROM cities ORDER BY name")
-        rows = cur.fetchall()
-        return [(r["id"], r["name"]) for r in rows]
+    return [(c.id, c.name) for c in directory.snapshot().cities]
+
+
+def find_city(name: str) -> tuple[int, str] | None:
+    """Місто за назвою без урахування регістру (індекс довідника)."""
+    c = directory.snapshot().city_by_name.get((name or "").strip().lower())
+    return (c.id, c.name) if c else None
 
 
 def add_city(name: str) -> bool:
-    ensure_schema()
     name = (name or "").strip()
     if not name:
         return False
     with get_cur() as cur:
         try:
             cur.execute("INSERT INTO cities(name) VALUES(%s)", (name,))
-            return True
         except Exception:
             return False
+    directory.invalidate()
+    return True
 
 
 def delete_city(city_id: int) -> bool:
-    ensure_schema()
     with get_cur() as cur:
+        # ТТ міста (і їх point_users) зникнуть каскадом
+        cur.execute("SELECT id FROM points WHERE city_id=%s", (city_id,))
+        point_ids = [r["id"] for r in cur.fetchall()]
         cur.execute("DELETE FROM cities WHERE id=%s", (city_id,))
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
+    directory.invalidate()
+    for point_id in point_ids:
+        membership.invalidate_point(point_id, users=True)
+    return deleted
 
 
 def list_points(city_id: int):
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute("SELECT id, name FROM points WHERE city_id=%s ORDER BY name", (city_id,))
-        rows = cur.fetchall()
-        return [(r["id"], r["name"]) for r in rows]
+    return [(p.id, p.name) for p in directory.snapshot().points_by_city.get(int(city_id), [])]
+
+
+def get_point(point_id: int) -> dict | None:
+    """ТТ + назва міста (для «Моя ТТ»)."""
+    snap = directory.snapshot()
+    p = snap.point_by_id.get(int(point_id))
+    c = snap.city_by_id.get(p.city_id) if p else None
+    if not p or not c:
+        return None
+    return {"id": p.id, "point_name": p.name, "city_id": c.id, "city_name": c.name}
 
 
 def add_point(city_id: int, name: str) -> bool:
-    ensure_schema()
     name = (name or "").strip()
     if not name:
         return False
     with get_cur() as cur:
         try:
             cur.execute("INSERT INTO points(city_id, name) VALUES(%s, %s)", (city_id, name))
-            return True
         except Exception:
             return False
+    directory.invalidate()
+    return True
 
 
 def delete_point(point_id: int) -> bool:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute("DELETE FROM points WHERE id=%s", (point_id,))
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
+    directory.invalidate()
+    # point_users цієї ТТ видалено каскадом
+    membership.invalidate_point(point_id, users=True)
+    return deleted
 
 
-def count_points(city_id: int) -> int:
-    ensure_schema()
+def list_cities_with_counts() -> list[dict]:
+    """
+    Екран «Міста» одним запитом: кількість ТТ і активні переміщення по місту
+    (moves_out — з ТТ цього міста, moves_in — на ТТ цього міста). «Активні» тут —
+    відправлені й не закриті: чернетки ще нікуди не їдуть, тож їх не рахуємо
+    (у списку «Активні переміщення» адміна чернетки є — там їх відправляють/скасовують).
+    """
     with get_cur() as cur:
-        cur.execute("SELECT COUNT(*) AS c FROM points WHERE city_id=%s", (city_id,))
-        row = cur.fetchone()
-        return int(row["c"]) if row else 0
+        cur.execute(
+            """
+            WITH pc AS (
+                SELECT city_id, COUNT(*) AS points
+                FROM points
+                GROUP BY city_id
+            ),
+            active AS (
+                SELECT fp.city_id AS from_city_id, tp.city_id AS to_city_id
+                FROM moves m
+                LEFT JOIN points fp ON fp.id = m.from_point_id
+                LEFT JOIN points tp ON tp.id = m.to_point_id
+                WHERE m.status NOT IN ('draft', 'done', 'canceled')
+            ),
+            mo AS (
+                SELECT from_city_id AS city_id, COUNT(*) AS moves_out
+                FROM active WHERE from_city_id IS NOT NULL
+                GROUP BY from_city_id
+            ),
+            mi AS (
+                SELECT to_city_id AS city_id, COUNT(*) AS moves_in
+                FROM active WHERE to_city_id IS NOT NULL
+                GROUP BY to_city_id
+            )
+            SELECT c.id, c.name,
+                   COALESCE(pc.points, 0) AS points,
+                   COALESCE(mo.moves_out, 0) AS moves_out,
+                   COALESCE(mi.moves_in, 0) AS moves_in
+            FROM cities c
+            LEFT JOIN pc ON pc.city_id = c.id
+            LEFT JOIN mo ON mo.city_id = c.id
+            LEFT JOIN mi ON mi.city_id = c.id
+            ORDER BY c.name
+            """
+        )
+        return [dict(r) for r in cur.fetchall()]
+
+
+def count_points(city_id: int) -> int:
+    return len(directory.snapshot().points_by_city.get(int(city_id), []))
 
@@ -0,0 +1,113 @@
+# app/db/membership.py
+"""
+Хто до якої ТТ прив’язаний — кеш в обидва боки:
+- telegram_id -> point_id (кнопки ТТ: Віддав/Отримав/Коригування)
+- point_id -> telegram_id-и отримувачів (розсилки), від новіших до старіших
+
+Записи живуть TTL секунд; link/unlink в auth_repo скидають їх явно.
+Непривʼязаний юзер теж кешується (None), щоб чужі натискання не йшли в БД.
+
+Кеш читають/пишуть потоки пулу БД паралельно: усі звернення до словників і
+лічильника поколінь — під self._lock (запит у БД — поза ним).
+"""
+import threading
+import time
+from typing import Optional
+
+from .pg import get_cur
+
+TTL = 300.0
+
+_MISSING = object()
+
+
+class Membership:
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self._user_point: dict[int, tuple[Optional[int], float]] = {}
+        self._point_users: dict[int, tuple[list[int], float]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        # метрики
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "users": len(self._user_point),
+            "points": len(self._point_users),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _cached(self, store: dict, key: int):
+        """(значення або _MISSING, покоління на момент читання)."""
+        with self._lock:
+            item = store.get(key)
+            if item is not None and time.monotonic() - item[1] < self.ttl:
+                self.hits += 1
+                return item[0], self._generation
+            self.misses += 1
+            return _MISSING, self._generation
+
+    def user_point(self, telegram_id: int) -> Optional[int]:
+        telegram_id = int(telegram_id)
+        point_id, generation = self._cached(self._user_point, telegram_id)
+        if point_id is not _MISSING:
+            return point_id
+
+        with get_cur() as cur:
+            cur.execute("SELECT point_id FROM point_users WHERE telegram_id=%s", (telegram_id,))
+            row = cur.fetchone()
+        point_id = int(row["point_id"]) if row else None
+        with self._lock:
+            # якщо поки читали був invalidate — відповідь могла застаріти, не кешуємо
+            if generation == self._generation:
+                self._user_point[telegram_id] = (point_id, time.monotonic())
+        return point_id
+
+    def point_recipients(self, point_id: int) -> list[int]:
+        point_id = int(point_id)
+        ids, generation = self._cached(self._point_users, point_id)
+        if ids is not _MISSING:
+            return list(ids)
+
+        with get_cur() as cur:
+            cur.execute(
+                "SELECT telegram_id FROM point_users WHERE point_id=%s ORDER BY created_at DESC",
+                (point_id,),
+            )
+            ids = [int(r["telegram_id"]) for r in cur.fetchall()]
+        with self._lock:
+            if generation != self._generation:
+                return ids
+            now = time.monotonic()
+            self._point_users[point_id] = (ids, now)
+            # заодно прогріваємо зворотний напрям
+            for uid in ids:
+                self._user_point[uid] = (point_id, now)
+        return list(ids)
+
+    def invalidate_user(self, telegram_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._user_point.pop(int(telegram_id), None)
+
+    def invalidate_point(self, point_id: int, users: bool = False) -> None:
+        """users=True — ТТ видалена: скидаємо і юзерів, прив’язаних до неї (каскад у point_users)."""
+        point_id = int(point_id)
+        with self._lock:
+            self._generation += 1
+            self._point_users.pop(point_id, None)
+            if users:
+                for uid in [u for u, (pid, _) in self._user_point.items() if pid == point_id]:
+                    del self._user_point[uid]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._user_point.clear()
+            self._point_users.clear()
+
+
+membership = Membership()
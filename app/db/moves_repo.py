@@ -1,342 +1,328 @@
 # app/db/moves_repo.py
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
 
-from .pg_schema import ensure_schema
-from .pg import get_cur
+from . import outbox_repo
+from .pg import get_cur, get_tx
 
+# notify(move) -> повідомлення для outbox (див. services.outbox.outbox_message);
+# викликається всередині транзакції, тож сповіщення комітяться разом зі зміною стану
+Notify = Callable[[Dict], List[Dict]]
 
-def create_move(created_by: int) -> int:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "INSERT INTO moves (created_by, operator_id) VALUES (%s, %s) RETURNING id",
-            (created_by, created_by),
-        )
-        return int(cur.fetchone()["id"])
 
+# move + назви точок; invoice_photos_count (фото поточної версії) і
+# photo_file_id (обкладинка) — колонки moves, їх ведуть записи фото нижче
+_MOVE_SELECT = """
+    SELECT
+        m.*,
+        fp.name AS from_point_name,
+        tp.name AS to_point_name
+    FROM {source} m
+    LEFT JOIN points fp ON fp.id = m.from_point_id
+    LEFT JOIN points tp ON tp.id = m.to_point_id
+"""
 
-def set_operator(move_id: int, operator_id: int) -> None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET operator_id=%s, updated_at=NOW() WHERE id=%s",
-            (operator_id, move_id),
-        )
+
+def _fetch_move(cur, move_id: int) -> Optional[Dict]:
+    cur.execute(_MOVE_SELECT.format(source="moves") + " WHERE m.id=%s", (move_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
 
 
-def set_from_point(move_id: int, point_id: int) -> None:
-    ensure_schema()
+def _update_move(move_id: int, assignments: str, params: tuple = ()) -> Optional[Dict]:
+    """
+    UPDATE moves SET <assignments> + повернення оновленого move з назвами ТТ
+    (як get_move) — одним запитом, без окремого get_move після запису.
+    None — move не знайдено.
+    """
     with get_cur() as cur:
         cur.execute(
-            "UPDATE moves SET from_point_id=%s, updated_at=NOW() WHERE id=%s",
-            (point_id, move_id),
+            f"""
+            WITH upd AS (
+                UPDATE moves SET {assignments}, updated_at=NOW()
+                WHERE id=%s
+                RETURNING *
+            )
+            """ + _MOVE_SELECT.format(source="upd"),
+            (*params, move_id),
         )
+        row = cur.fetchone()
+        return dict(row) if row else None
 
 
-def set_to_point(move_id: int, point_id: int) -> None:
-    ensure_schema()
+def create_move(created_by: int) -> int:
     with get_cur() as cur:
         cur.execute(
-            "UPDATE moves SET to_point_id=%s, updated_at=NOW() WHERE id=%s",
-            (point_id, move_id),
+            "INSERT INTO moves (created_by, operator_id) VALUES (%s, %s) RETURNING id",
+            (created_by, created_by),
         )
+        return int(cur.fetchone()["id"])
 
 
-def set_photo(move_id: int, file_id: Optional[str]) -> None:
-    """
-    photo_file_id = превʼю (перше фото). Для PDF можна ставити None.
-    """
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET photo_file_id=%s, updated_at=NOW() WHERE id=%s",
-            (file_id, move_id),
-        )
+# ---------- setters: повертають оновлений move (або None, якщо нема) ----------
+def set_operator(move_id: int, operator_id: int) -> Optional[Dict]:
+    return _update_move(move_id, "operator_id=%s", (operator_id,))
+
+
+def set_from_point(move_id: int, point_id: int) -> Optional[Dict]:
+    return _update_move(move_id, "from_point_id=%s", (point_id,))
 
-    # якщо file_id None — не пишемо в історію (бо історія photo-centric)
-    if not file_id:
-        return
 
-    # записати в історію як поточну версію (V1 якщо ще не було)
-    v = get_invoice_version(move_id)
-    add_invoice_version(move_id, v, file_id)
+def set_to_point(move_id: int, point_id: int) -> Optional[Dict]:
+    return _update_move(move_id, "to_point_id=%s", (point_id,))
 
 
 # ---------- ✅ PDF INVOICE (independent) ----------
-def set_invoice_pdf(move_id: int, file_id: Optional[str]) -> None:
+def set_invoice_pdf(move_id: int, file_id: Optional[str]) -> Optional[Dict]:
     """
     invoice_pdf_file_id = file_id PDF накладної (незалежно від фото).
     Якщо None — прибираємо PDF.
     """
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET invoice_pdf_file_id=%s, updated_at=NOW() WHERE id=%s",
-            (file_id, move_id),
-        )
-
+    return _update_move(move_id, "invoice_pdf_file_id=%s", (file_id,))
 
-def clear_invoice_pdf(move_id: int) -> None:
-    set_invoice_pdf(move_id, None)
 
-
-def get_invoice_pdf(move_id: int) -> Optional[str]:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute("SELECT invoice_pdf_file_id FROM moves WHERE id=%s", (move_id,))
-        row = cur.fetchone()
-        return row.get("invoice_pdf_file_id") if row else None
+def clear_invoice_pdf(move_id: int) -> Optional[Dict]:
+    return set_invoice_pdf(move_id, None)
 # -----------------------------------------------
 
 
-def set_note(move_id: int, note: str) -> None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET note=%s, updated_at=NOW() WHERE id=%s",
-            (note, move_id),
-        )
+def set_note(move_id: int, note: str) -> Optional[Dict]:
+    return _update_move(move_id, "note=%s", (note,))
 
 
-def set_status(move_id: int, status: str) -> bool:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET status=%s, updated_at=NOW() WHERE id=%s",
-            (status, move_id),
-        )
-        return (cur.rowcount or 0) > 0
+def set_status(move_id: int, status: str) -> Optional[Dict]:
+    return _update_move(move_id, "status=%s", (status,))
 
 
-def get_move(move_id: int) -> Optional[Dict]:
+def close_move(move_id: int, notify: Optional[Notify] = None) -> Optional[Dict]:
     """
-    move + назви точок + invoice_photos_count для поточної invoice_version
+    Закриття оператором: status='done' + сповіщення учасникам (outbox) однією транзакцією.
+    move["participants"] — telegram_id всіх, хто прив’язаний до ТТ-відправника і ТТ-отримувача.
+    move["deliveries"] — попередні доставки (редагуємо їх на місці).
     """
-    ensure_schema()
-    with get_cur() as cur:
+    with get_tx() as cur:
         cur.execute(
             """
-            SELECT
-                m.*,
-                fp.name AS from_point_name,
-                tp.name AS to_point_name,
-                COALESCE((
-                    SELECT COUNT(*)
-                    FROM move_invoice_photos mip
-                    WHERE mip.move_id = m.id
-                      AND mip.version = m.invoice_version
-                ), 0) AS invoice_photos_count
-            FROM moves m
-            LEFT JOIN points fp ON fp.id = m.from_point_id
-            LEFT JOIN points tp ON tp.id = m.to_point_id
-            WHERE m.id=%s
-            """,
+            WITH upd AS (
+                UPDATE moves SET status='done', updated_at=NOW()
+                WHERE id=%s
+                RETURNING *
+            )
+            """ + _MOVE_SELECT.format(source="upd"),
             (move_id,),
         )
         row = cur.fetchone()
-        return dict(row) if row else None
-
+        if not row:
+            return None
+        m = dict(row)
 
-def list_moves(limit: int = 20) -> List[Dict]:
-    ensure_schema()
-    with get_cur() as cur:
         cur.execute(
             """
-            SELECT m.*,
-                   fp.name AS from_point_name,
-                   tp.name AS to_point_name
-            FROM moves m
-            LEFT JOIN points fp ON fp.id = m.from_point_id
-            LEFT JOIN points tp ON tp.id = m.to_point_id
-            ORDER BY m.id DESC
-            LIMIT %s
+            SELECT telegram_id
+            FROM point_users
+            WHERE point_id = ANY(%s)
+            ORDER BY created_at DESC
             """,
-            (limit,),
+            ([p for p in (m.get("from_point_id"), m.get("to_point_id")) if p],),
         )
-        return cur.fetchall()
+        m["participants"] = [r["telegram_id"] for r in cur.fetchall()]
+        m["deliveries"] = _list_deliveries(cur, move_id)
+
+        if notify:
+            outbox_repo.enqueue_many(cur, notify(m))
+        return m
 
 
-def list_moves_active(limit: int = 50) -> List[Dict]:
-    ensure_schema()
+def get_move(move_id: int) -> Optional[Dict]:
+    """
+    move + назви точок + invoice_photos_count для поточної invoice_version
+    """
     with get_cur() as cur:
-        cur.execute(
-            """
-            SELECT m.*,
-                   fp.name AS from_point_name,
-                   tp.name AS to_point_name
-            FROM moves m
-            LEFT JOIN points fp ON fp.id = m.from_point_id
-            LEFT JOIN points tp ON tp.id = m.to_point_id
-            WHERE m.status NOT IN ('done', 'canceled')
-            ORDER BY m.id DESC
-            LIMIT %s
-            """,
-            (limit,),
-        )
-        return cur.fetchall()
+        return _fetch_move(cur, move_id)
 
 
-def list_moves_closed(limit: int = 30) -> List[Dict]:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            """
-            SELECT m.*,
-                   fp.name AS from_point_name,
-                   tp.name AS to_point_name
-            FROM moves m
-            LEFT JOIN points fp ON fp.id = m.from_point_id
-            LEFT JOIN points tp ON tp.id = m.to_point_id
-            WHERE m.status IN ('done', 'canceled')
-            ORDER BY m.id DESC
-            LIMIT %s
-            """,
-            (limit,),
-        )
-        return cur.fetchall()
+# ---------- списки (keyset-пагінація) ----------
+# scope -> фільтр; для active/closed є часткові індекси по id (міграція 0008).
+# Чернетки — в active: оператор має бачити невідправлене, щоб відправити або скасувати
+LIST_SCOPES = {
+    "all": "TRUE",
+    "active": "m.status NOT IN ('done', 'canceled')",
+    "closed": "m.status IN ('done', 'canceled')",
+}
 
 
-# --------- TT ACTIONS ---------
-def mark_handed(move_id: int, user_id: int) -> bool:
-    """
-    True  -> підтверджено вперше
-    False -> вже було підтверджено раніше
+def list_moves_page(
+    scope: str = "all", cursor: Optional[int] = None, direction: str = "next", limit: int = 20,
+) -> Dict:
     """
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            """
-            UPDATE moves
-            SET handed_at=NOW(),
-                handed_by=%s,
-                updated_at=NOW()
-            WHERE id=%s
-              AND handed_at IS NULL
-            """,
-            (user_id, move_id),
-        )
-        return (cur.rowcount or 0) > 0
+    Сторінка списку переміщень, новіші першими. Курсор — id крайнього рядка
+    попередньої сторінки: "next" -> id < cursor (старіші), "prev" -> id > cursor (новіші).
+    Без OFFSET: ціна сторінки не залежить від розміру moves.
 
+    Рядки — тільки поля для списку (id, status, ТТ, вкладення), не m.*.
 
-def mark_received(move_id: int, user_id: int) -> bool:
-    """
-    True  -> підтверджено вперше
-    False -> вже було підтверджено раніше
+    Повертає {"items", "prev_cursor", "next_cursor"}; курсор None — далі сторінок нема.
     """
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            """
-            UPDATE moves
-            SET received_at=NOW(),
-                received_by=%s,
-                updated_at=NOW()
-            WHERE id=%s
-              AND received_at IS NULL
-            """,
-            (user_id, move_id),
-        )
-        return (cur.rowcount or 0) > 0
-
+    where = LIST_SCOPES[scope]
+    prev = direction == "prev" and cursor is not None
+    if cursor is not None:
+        where += " AND m.id > %(cursor)s" if prev else " AND m.id < %(cursor)s"
 
-def clear_hand_receive(move_id: int) -> None:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute(
-            """
-            UPDATE moves
-            SET handed_at=NULL, handed_by=NULL,
-                received_at=NULL, received_by=NULL,
-                updated_at=NOW()
-            WHERE id=%s
+            f"""
+            SELECT m.id, m.status, m.invoice_photos_count, m.invoice_pdf_file_id,
+                   fp.name AS from_point_name,
+                   tp.name AS to_point_name
+            FROM moves m
+            LEFT JOIN points fp ON fp.id = m.from_point_id
+            LEFT JOIN points tp ON tp.id = m.to_point_id
+            WHERE {where}
+            ORDER BY m.id {"ASC" if prev else "DESC"}
+            LIMIT %(limit)s
             """,
-            (move_id,),
+            {"cursor": cursor, "limit": limit + 1},
         )
+        items = [dict(r) for r in cur.fetchall()]
+
+    # +1 рядок — тільки щоб знати, чи є ще сторінка в цьому напрямку
+    more = len(items) > limit
+    items = items[:limit]
+    if prev:
+        items.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    return {
+        "items": items,
+        "prev_cursor": items[0]["id"] if items and has_prev else None,
+        "next_cursor": items[-1]["id"] if items and has_next else None,
+    }
+
+
+# side -> (колонка часу, колонка хто, чия ТТ має підтвердити, колонка часу другої сторони)
+_CONFIRM_SIDES = {
+    "handed": ("handed_at", "handed_by", "from_point_id", "received_at"),
+    "received": ("received_at", "received_by", "to_point_id", "handed_at"),
+}
+
+
+def confirm(
+    move_id: int, user_id: int, side: str, notify: Optional[Notify] = None, point_id: Optional[int] = None,
+) -> tuple[str, Optional[Dict]]:
+    """
+    Підтвердження ТТ ("handed" / "received") одним UPDATE ... RETURNING:
+    статус 'sent' + юзер прив’язаний до потрібної ТТ + ще не підтверджено ->
+    ставимо час/хто, а якщо друга сторона вже підтвердила — одразу status='done'.
 
+    Row lock UPDATE-а серіалізує одночасні "Віддав"/"Отримав": друге
+    підтвердження бачить перше і закриває переміщення.
 
-# --------- CORRECTION ---------
-def request_correction(move_id: int, user_id: int, note: str, photo_file_id: Optional[str]) -> None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            """
-            UPDATE moves
-            SET correction_status='requested',
-                correction_note=%s,
-                correction_photo_file_id=%s,
-                correction_by=%s,
-                correction_at=NOW(),
-                updated_at=NOW()
-            WHERE id=%s
-            """,
-            (note, photo_file_id, user_id, move_id),
-        )
+    notify(move) -> повідомлення в outbox у тій самій транзакції.
+    point_id — ТТ юзера, якщо вже відома (кеш membership); інакше підзапит до point_users.
 
+    Повертає (result, move):
+      "ok"  -> move після апдейту (status='done', якщо саме ми закрили)
+      "not_found" / "not_sent" / "not_linked" / "not_owner" / "already" -> (result, None)
+    """
+    at_col, by_col, point_col, other_col = _CONFIRM_SIDES[side]
+    params = {"mid": move_id, "uid": user_id, "pid": point_id}
+    my_point = "%(pid)s" if point_id else "(SELECT point_id FROM point_users WHERE telegram_id=%(uid)s)"
 
-def resolve_correction(move_id: int) -> None:
-    ensure_schema()
-    with get_cur() as cur:
+    with get_tx() as cur:
         cur.execute(
-            "UPDATE moves SET correction_status='resolved', updated_at=NOW() WHERE id=%s",
-            (move_id,),
+            f"""
+            WITH upd AS (
+                UPDATE moves m
+                SET {at_col}=NOW(),
+                    {by_col}=%(uid)s,
+                    status = CASE WHEN m.{other_col} IS NOT NULL THEN 'done' ELSE m.status END,
+                    updated_at=NOW()
+                WHERE m.id=%(mid)s
+                  AND lower(COALESCE(m.status, ''))='sent'
+                  AND m.{at_col} IS NULL
+                  AND m.{point_col} = {my_point}
+                RETURNING m.*
+            )
+            """ + _MOVE_SELECT.format(source="upd"),
+            params,
         )
+        row = cur.fetchone()
+        if row:
+            m = dict(row)
+            if notify:
+                outbox_repo.enqueue_many(cur, notify(m))
+            return "ok", m
 
-
-def bump_invoice_version(move_id: int) -> None:
-    ensure_schema()
-    with get_cur() as cur:
+        # холодний шлях: з'ясовуємо, чому не підтвердилось
         cur.execute(
-            "UPDATE moves SET invoice_version=invoice_version+1, updated_at=NOW() WHERE id=%s",
-            (move_id,),
+            f"""
+            SELECT m.status, m.{point_col} AS point_id, m.{at_col} AS confirmed_at,
+                   {my_point} AS my_point
+            FROM moves m
+            WHERE m.id=%(mid)s
+            """,
+            params,
         )
+        row = cur.fetchone()
 
+    if not row:
+        return "not_found", None
+    if (row.get("status") or "").lower() != "sent":
+        return "not_sent", None
+    if not row.get("my_point"):
+        return "not_linked", None
+    if int(row["my_point"]) != int(row.get("point_id") or 0):
+        return "not_owner", None
+    return "already", None
 
-def set_invoice_photo(move_id: int, file_id: str) -> None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            "UPDATE moves SET photo_file_id=%s, updated_at=NOW() WHERE id=%s",
-            (file_id, move_id),
-        )
 
-    v = get_invoice_version(move_id)
-    add_invoice_version(move_id, v, file_id)
+def clear_hand_receive(move_id: int) -> Optional[Dict]:
+    return _update_move(
+        move_id,
+        """
+        handed_at=NULL, handed_by=NULL,
+        received_at=NULL, received_by=NULL
+        """,
+    )
 
 
-def reset_for_reinvoice(move_id: int) -> None:
-    ensure_schema()
-    with get_cur() as cur:
+# --------- CORRECTION ---------
+def request_correction(
+    move_id: int, user_id: int, note: str, photo_file_id: Optional[str],
+    notify: Optional[Notify] = None,
+) -> Optional[Dict]:
+    """Коригування від ТТ + сповіщення оператору (outbox) однією транзакцією. None — нема move."""
+    with get_tx() as cur:
         cur.execute(
             """
-            UPDATE moves
-            SET status='sent',
-                handed_at=NULL, handed_by=NULL,
-                received_at=NULL, received_by=NULL,
-                correction_status='resolved',
-                updated_at=NOW()
-            WHERE id=%s
-            """,
-            (move_id,),
+            WITH upd AS (
+                UPDATE moves
+                SET correction_status='requested',
+                    correction_note=%s,
+                    correction_photo_file_id=%s,
+                    correction_by=%s,
+                    correction_at=NOW(),
+                    updated_at=NOW()
+                WHERE id=%s
+                RETURNING *
+            )
+            """ + _MOVE_SELECT.format(source="upd"),
+            (note, photo_file_id, user_id, move_id),
         )
+        row = cur.fetchone()
+        if not row:
+            return None
+        m = dict(row)
+        if notify:
+            outbox_repo.enqueue_many(cur, notify(m))
+        return m
 
 
 # --------- INVOICE HISTORY ---------
-def add_invoice_version(move_id: int, version: int, file_id: str) -> None:
-    ensure_schema()
-    with get_cur() as cur:
-        cur.execute(
-            """
-            INSERT INTO move_invoices(move_id, version, photo_file_id)
-            VALUES(%s, %s, %s)
-            ON CONFLICT (move_id, version)
-            DO UPDATE SET photo_file_id = EXCLUDED.photo_file_id
-            """,
-            (move_id, version, file_id),
-        )
 
 
 def list_invoices(move_id: int) -> list[dict]:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute(
             """
@@ -351,7 +337,6 @@ def list_invoices(move_id: int) -> list[dict]:
 
 
 def get_invoice_version(move_id: int) -> int:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute("SELECT invoice_version FROM moves WHERE id=%s", (move_id,))
         row = cur.fetchone()
@@ -359,29 +344,104 @@ def get_invoice_version(move_id: int) -> int:
 
 
 # ✅ multi-photo for a version (NEW SCHEMA idx)
-def add_invoice_photos(move_id: int, version: int, photos: list[str]) -> None:
+def _replace_invoice_photos(cur, move_id: int, version: int, photos: list[str]) -> None:
+    cur.execute(
+        "DELETE FROM move_invoice_photos WHERE move_id=%s AND version=%s",
+        (move_id, version),
+    )
+    if not photos:
+        return
+    # один INSERT на весь альбом: idx = позиція в масиві (1..N)
+    cur.execute(
+        """
+        INSERT INTO move_invoice_photos(move_id, version, idx, photo_file_id)
+        SELECT %s, %s, t.idx, t.fid
+        FROM unnest(%s::text[]) WITH ORDINALITY AS t(fid, idx)
+        """,
+        (move_id, version, list(photos)),
+    )
+
+
+def append_invoice_photos(move_id: int, photos: list[str], limit: int = 10) -> Optional[Dict]:
     """
-    Зберігає всі фото для (move_id, version).
-    Повністю перезаписує idx 1..N.
+    Дописує фото в КІНЕЦЬ поточної версії (idx = max+1..), нічого не перезаписує.
+    - file_id, які вже є у версії, пропускаємо
+    - якщо разом вийде більше limit — пишемо перші limit-count, решту
+      повертаємо як overflow (over_limit=True)
+    - перше фото версії стає превʼю (moves.photo_file_id + історія move_invoices)
+    - moves.invoice_photos_count оновлюється в тій же транзакції
+
+    Повертає {"version", "count", "added", "overflow", "over_limit"} або None, якщо move нема.
     """
-    ensure_schema()
-    with get_cur() as cur:
+    with get_tx() as cur:
+        # lock на move: паралельні дописування не отримають однаковий idx
         cur.execute(
-            "DELETE FROM move_invoice_photos WHERE move_id=%s AND version=%s",
+            "SELECT COALESCE(invoice_version, 1) AS v FROM moves WHERE id=%s FOR UPDATE",
+            (move_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        version = int(row["v"])
+
+        cur.execute(
+            "SELECT idx, photo_file_id FROM move_invoice_photos WHERE move_id=%s AND version=%s",
             (move_id, version),
         )
-        for i, fid in enumerate(photos, start=1):
+        rows = cur.fetchall()
+        existing = {r["photo_file_id"] for r in rows}
+        last_idx = max((int(r["idx"]) for r in rows), default=0)
+
+        new = [fid for fid in dict.fromkeys(photos) if fid and fid not in existing]
+        # альбом, що не влазить повністю: беремо скільки є місця, решту — в overflow
+        room = max(limit - len(rows), 0)
+        new, dropped = new[:room], new[room:]
+        result = {
+            "version": version, "count": len(rows), "added": 0,
+            "overflow": len(dropped), "over_limit": bool(dropped),
+        }
+
+        if not new:
+            return result
+
+        cur.execute(
+            """
+            INSERT INTO move_invoice_photos(move_id, version, idx, photo_file_id)
+            SELECT %s, %s, %s + t.idx, t.fid
+            FROM unnest(%s::text[]) WITH ORDINALITY AS t(fid, idx)
+            """,
+            (move_id, version, last_idx, new),
+        )
+
+        result["count"] = len(rows) + len(new)
+        result["added"] = len(new)
+
+        # лічильник фото (і обкладинка, якщо це перші фото версії) — в тій же транзакції
+        cur.execute(
+            """
+            UPDATE moves
+            SET invoice_photos_count=%s,
+                photo_file_id = CASE WHEN %s THEN %s ELSE photo_file_id END,
+                updated_at=NOW()
+            WHERE id=%s
+            """,
+            (result["count"], not rows, new[0], move_id),
+        )
+        if not rows:
             cur.execute(
                 """
-                INSERT INTO move_invoice_photos(move_id, version, idx, photo_file_id)
-                VALUES(%s, %s, %s, %s)
+                INSERT INTO move_invoices(move_id, version, photo_file_id)
+                VALUES(%s, %s, %s)
+                ON CONFLICT (move_id, version)
+                DO UPDATE SET photo_file_id = EXCLUDED.photo_file_id
                 """,
-                (move_id, version, i, fid),
+                (move_id, version, new[0]),
             )
 
+        return result
+
 
 def list_invoice_photos(move_id: int, version: int) -> list[str]:
-    ensure_schema()
     with get_cur() as cur:
         cur.execute(
             """
@@ -393,4 +453,130 @@ def list_invoice_photos(move_id: int, version: int) -> list[str]:
             (move_id, version),
         )
         rows = cur.fetchall()
-        return [r["photo_file_id"] for r in rows]
\ No newline at end of file
+        return [r["photo_file_id"] for r in rows]
+
+
+# --------- REINVOICE (одна транзакція) ---------
+def reinvoice(move_id: int, photos: list[str], notify: Optional[Notify] = None) -> Optional[Dict]:
+    """
+    Нова накладна однією транзакцією:
+    V+1 + превʼю, фото V+1 (idx 1..N), історія move_invoices,
+    статус 'sent' зі скиданням підтверджень/коригування.
+
+    UPDATE бере row lock, тож паралельні реінвойси однієї накладної
+    виконуються по черзі і не отримують одну й ту ж версію.
+
+    notify(move) -> outbox у тій самій транзакції; move["deliveries"] — попередні
+    доставки (щоб прибрати застарілі кнопки).
+
+    Повертає {"move", "version", "from_rec", "to_rec"} або None, якщо move нема.
+    PDF не чіпаємо — він незалежний.
+    """
+    if not photos:
+        raise ValueError("reinvoice: photos is empty")
+
+    with get_tx() as cur:
+        cur.execute(
+            """
+            UPDATE moves
+            SET invoice_version = COALESCE(invoice_version, 1) + 1,
+                photo_file_id = %s,
+                invoice_photos_count = %s,
+                status = 'sent',
+                handed_at = NULL, handed_by = NULL,
+                received_at = NULL, received_by = NULL,
+                correction_status = 'resolved',
+                updated_at = NOW()
+            WHERE id=%s
+            RETURNING invoice_version
+            """,
+            (photos[0], len(photos), move_id),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        version = int(row["invoice_version"])
+
+        _replace_invoice_photos(cur, move_id, version, photos)
+
+        cur.execute(
+            """
+            INSERT INTO move_invoices(move_id, version, photo_file_id)
+            VALUES(%s, %s, %s)
+            ON CONFLICT (move_id, version)
+            DO UPDATE SET photo_file_id = EXCLUDED.photo_file_id
+            """,
+            (move_id, version, photos[0]),
+        )
+
+        m = _fetch_move(cur, move_id)
+
+        point_ids = [int(p) for p in (m.get("from_point_id"), m.get("to_point_id")) if p]
+        recipients: dict[int, list[int]] = {pid: [] for pid in point_ids}
+        if point_ids:
+            cur.execute(
+                """
+                SELECT point_id, telegram_id
+                FROM point_users
+                WHERE point_id = ANY(%s)
+                ORDER BY created_at DESC
+                """,
+                (point_ids,),
+            )
+            for r in cur.fetchall():
+                recipients[int(r["point_id"])].append(int(r["telegram_id"]))
+
+        if notify:
+            m["deliveries"] = _list_deliveries(cur, move_id)
+            outbox_repo.enqueue_many(cur, notify(m))
+
+    return {
+        "move": m,
+        "version": version,
+        "from_rec": recipients.get(int(m.get("from_point_id") or 0), []),
+        "to_rec": recipients.get(int(m.get("to_point_id") or 0), []),
+    }
+
+
+# --------- DELIVERIES (ledger надісланих повідомлень) ---------
+def _list_deliveries(cur, move_id: int) -> list[dict]:
+    cur.execute(
+        """
+        SELECT telegram_id, role, invoice_version, message_ids, kb_message_id, kb_caption
+        FROM move_deliveries
+        WHERE move_id=%s
+        """,
+        (move_id,),
+    )
+    return [dict(r) for r in cur.fetchall()]
+
+
+def record_deliveries(move_id: int, version: int, rows: list[dict]) -> None:
+    """
+    rows: {"telegram_id", "role", "message_ids", "kb_caption"}.
+    Кнопки — на останньому повідомленні пакета. На людину тримаємо тільки останній пакет.
+    """
+    if not rows:
+        return
+    with get_tx() as cur:
+        for r in rows:
+            ids = [int(x) for x in r["message_ids"]]
+            cur.execute(
+                """
+                INSERT INTO move_deliveries(
+                    move_id, telegram_id, role, invoice_version, message_ids, kb_message_id, kb_caption
+                )
+                VALUES(%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (move_id, telegram_id) DO UPDATE
+                SET role=EXCLUDED.role,
+                    invoice_version=EXCLUDED.invoice_version,
+                    message_ids=EXCLUDED.message_ids,
+                    kb_message_id=EXCLUDED.kb_message_id,
+                    kb_caption=EXCLUDED.kb_caption,
+                    created_at=NOW()
+                """,
+                (
+                    move_id, int(r["telegram_id"]), r["role"], version,
+                    ids, ids[-1] if ids else None, bool(r.get("kb_caption")),
+                ),
+            )
@@ -0,0 +1,146 @@
+# app/db/outbox_repo.py
+from typing import Optional, List, Dict
+
+from psycopg2.extras import Json
+
+from .pg import get_cur
+
+
+def enqueue_many(cur, messages: list[dict]) -> int:
+    """
+    Пише повідомлення в outbox курсором ВИКЛИКАЮЧОГО (тобто в його транзакції).
+    message: {"chat_id", "method", "payload", "kind"} + опційно:
+      "digest_window" > 0 — подія для зведення: піде разом з іншими подіями
+          цього чату, коли закінчиться вікно (вікно відкриває перша подія)
+      "flush_digest" — спершу віддати накопичене зведення цього чату (одразу due)
+    """
+    for msg in messages:
+        if msg.get("flush_digest"):
+            flush_digest(cur, msg["chat_id"])
+
+        window = int(msg.get("digest_window") or 0)
+        if window > 0:
+            cur.execute(
+                """
+                INSERT INTO outbox(chat_id, method, payload, kind, digest, available_at)
+                VALUES(%s, %s, %s, %s, TRUE, COALESCE(
+                    (SELECT MIN(available_at) FROM outbox
+                     WHERE chat_id=%s AND digest AND status='pending' AND attempts=0),
+                    NOW() + make_interval(secs => %s)
+                ))
+                """,
+                (msg["chat_id"], msg["method"], Json(msg["payload"]), msg.get("kind"), msg["chat_id"], window),
+            )
+            continue
+
+        cur.execute(
+            """
+            INSERT INTO outbox(chat_id, method, payload, kind)
+            VALUES(%s, %s, %s, %s)
+            """,
+            (msg["chat_id"], msg["method"], Json(msg["payload"]), msg.get("kind")),
+        )
+    return len(messages)
+
+
+def flush_digest(cur, chat_id: int) -> None:
+    """
+    Накопичене зведення чату — одразу due (напр. перед коригуванням).
+    attempts=0 — не чіпаємо рядки, які воркер уже забрав (оренда) або відклав на retry.
+    """
+    cur.execute(
+        """
+        UPDATE outbox SET available_at=NOW()
+        WHERE chat_id=%s AND digest AND status='pending' AND attempts=0 AND available_at > NOW()
+        """,
+        (chat_id,),
+    )
+
+
+def add(messages: list[dict]) -> int:
+    with get_cur() as cur:
+        return enqueue_many(cur, messages)
+
+
+def claim(limit: int = 20, lease_seconds: int = 60) -> List[Dict]:
+    """
+    Забирає due-повідомлення на відправку. Рядок "орендується" на lease_seconds:
+    якщо процес впаде посеред відправки — після оренди повідомлення знову стане due.
+    SKIP LOCKED — кілька воркерів/інстансів не заберуть одне й те саме.
+    """
+    with get_cur() as cur:
+        cur.execute(
+            """
+            UPDATE outbox o
+            SET available_at = NOW() + make_interval(secs => %s),
+                attempts = o.attempts + 1
+            WHERE o.id IN (
+                SELECT id FROM outbox
+                WHERE status = 'pending' AND available_at <= NOW()
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING o.id, o.chat_id, o.method, o.payload, o.kind, o.attempts, o.digest
+            """,
+            (lease_seconds, limit),
+        )
+        return sorted(cur.fetchall(), key=lambda r: r["id"])
+
+
+def mark_sent(outbox_id: int) -> None:
+    with get_cur() as cur:
+        cur.execute(
+            "UPDATE outbox SET status='sent', sent_at=NOW(), last_error=NULL WHERE id=%s",
+            (outbox_id,),
+        )
+
+
+def mark_retry(outbox_id: int, error: str, delay_seconds: float) -> None:
+    with get_cur() as cur:
+        cur.execute(
+            """
+            UPDATE outbox
+            SET last_error=%s, available_at = NOW() + make_interval(secs => %s)
+            WHERE id=%s
+            """,
+            (error, delay_seconds, outbox_id),
+        )
+
+
+def replace_with_fallback(outbox_id: int, method: str, payload: dict, error: str) -> None:
+    """Edit не вдався — той самий рядок стає fallback-повідомленням і одразу due."""
+    with get_cur() as cur:
+        cur.execute(
+            """
+            UPDATE outbox
+            SET method=%s, payload=%s, last_error=%s, attempts=0, available_at=NOW()
+            WHERE id=%s
+            """,
+            (method, Json(payload), error, outbox_id),
+        )
+
+
+def mark_dead(outbox_id: int, error: str) -> None:
+    """Dead letter: більше не пробуємо, рядок лишається для розбору."""
+    with get_cur() as cur:
+        cur.execute(
+            "UPDATE outbox SET status='dead', last_error=%s WHERE id=%s",
+            (error, outbox_id),
+        )
+
+
+def purge_sent(older_than_days: int = 7) -> int:
+    with get_cur() as cur:
+        cur.execute(
+            "DELETE FROM outbox WHERE status='sent' AND sent_at < NOW() - make_interval(days => %s)",
+            (older_than_days,),
+        )
+        return cur.rowcount or 0
+
+
+def count_pending() -> Optional[int]:
+    with get_cur() as cur:
+        cur.execute("SELECT COUNT(*) AS c FROM outbox WHERE status='pending'")
+        row = cur.fetchone()
+        return int(row["c"]) if row else 0
@@ -1,11 +1,14 @@
 import os
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from contextlib import contextmanager
 
 # ВАЖЛИВО:
 # Не кешуємо DATABASE_URL на імпорті, бо .env може завантажитися пізніше.
-# Читаємо змінну кожен раз всередині get_conn().
+# Пул створюється ліниво при першому get_conn(), тоді ж читаємо змінні.
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -14,22 +17,189 @@ except Exception:
     pass
 
 
-@contextmanager
-def get_conn():
+class PoolTimeout(RuntimeError):
+    """Не дочекались вільного зʼєднання за DB_POOL_TIMEOUT секунд."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+class _Pool:
+    """
+    Довгоживучий пул psycopg2-зʼєднань.
+    - min/max розмір: DB_POOL_MIN / DB_POOL_MAX
+    - acquire timeout: DB_POOL_TIMEOUT (сек), далі PoolTimeout
+    - health check: зʼєднання, що простояло довше DB_POOL_CHECK_IDLE сек, пінгуємо SELECT 1
+    """
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int, timeout: float, check_idle: float):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        # ThreadedConnectionPool при вичерпанні кидає помилку, тому обмежуємо семафором
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: dict[int, float] = {}
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last = self._last_used.get(id(conn))
+        if last is not None and time.monotonic() - last < self.check_idle:
+            return True
+        try:
+            # свіже зʼєднання ще не в autocommit: без цього пінг відкрив би транзакцію
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"DB pool exhausted ({self.maxconn} conns busy > {self.timeout}s)")
+        try:
+            # після обриву БД мертвими можуть бути всі maxconn простоюючих зʼєднань;
+            # заміну теж перевіряємо, тож спроб — maxconn + 1 (остання вже нове зʼєднання)
+            for _ in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._healthy(conn):
+                    conn.autocommit = True
+                    return conn
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("DB pool: no healthy connection")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn) -> None:
+        try:
+            broken = conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            if broken and not conn.closed:
+                try:
+                    conn.rollback()
+                    broken = False
+                except psycopg2.Error:
+                    broken = True
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    def closeall(self) -> None:
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+_pool: _Pool | None = None
+_pool_lock = threading.Lock()
+# на скільки процесів ділимо DB_POOL_MAX (шардування: кожен воркер має свій пул)
+_pool_share = 1
+
+
+def set_pool_share(processes: int) -> None:
+    """Викликати до першого get_conn()/імпорту db.aio: пул процесу = DB_POOL_MAX // processes."""
+    global _pool_share
+    _pool_share = max(1, processes)
+
+
+def pool_limits() -> tuple[int, int]:
+    """(min, max) розмір пулу з env — без створення самого пулу."""
+    minconn = max(0, _env_int("DB_POOL_MIN", 1))
+    maxconn = max(1, minconn, _env_int("DB_POOL_MAX", 10))
+    if _pool_share > 1:
+        maxconn = max(1, maxconn // _pool_share)
+        minconn = min(minconn, maxconn)
+    return minconn, maxconn
+
+
+def get_database_url() -> str:
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise RuntimeError("DATABASE_URL is not set (Railway Postgres).")
+    return database_url
+
+
+def get_pool() -> _Pool:
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            database_url = get_database_url()
+            minconn, maxconn = pool_limits()
+            _pool = _Pool(
+                database_url,
+                minconn=minconn,
+                maxconn=maxconn,
+                timeout=_env_float("DB_POOL_TIMEOUT", 10.0),
+                check_idle=_env_float("DB_POOL_CHECK_IDLE", 30.0),
+            )
+    return _pool
+
 
-    conn = psycopg2.connect(database_url)
-    conn.autocommit = True
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def get_conn():
+    pool = get_pool()
+    conn = pool.getconn()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.putconn(conn)
 
 
 @contextmanager
 def get_cur():
     with get_conn() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            yield cur
\ No newline at end of file
+            yield cur
+
+
+@contextmanager
+def get_tx():
+    """
+    Курсор в ОДНІЙ транзакції на одному зʼєднанні:
+    COMMIT якщо блок завершився без помилки, інакше ROLLBACK.
+    """
+    with get_conn() as conn:
+        conn.autocommit = False
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                yield cur
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            # зʼєднання, що впало посеред транзакції, putconn закриє й викине з пулу
+            if not conn.closed:
+                try:
+                    conn.autocommit = True
+                except psycopg2.Error:
+                    pass
@@ -1,160 +1,392 @@
 # app/db/pg_schema.py
-from .pg import get_cur
-
-
-def ensure_schema():
-    with get_cur() as cur:
-        # users
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            telegram_id BIGINT PRIMARY KEY,
-            username TEXT,
-            full_name TEXT,
-            role TEXT DEFAULT 'point',
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """)
+import logging
+from typing import Callable
 
-        # cities
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS cities (
-            id SERIAL PRIMARY KEY,
-            name TEXT UNIQUE NOT NULL
-        );
-        """)
+from .pg import get_conn
 
-        # points
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS points (
-            id SERIAL PRIMARY KEY,
-            city_id INT NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
-            name TEXT NOT NULL,
-            UNIQUE(city_id, name)
-        );
-        """)
+log = logging.getLogger(__name__)
 
-        # point_users
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS point_users (
-            telegram_id BIGINT PRIMARY KEY REFERENCES users(telegram_id) ON DELETE CASCADE,
-            point_id INT NOT NULL REFERENCES points(id) ON DELETE CASCADE,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """)
+# Ключ для pg_advisory_lock, щоб два інстанси не накатували міграції одночасно
+_MIGRATIONS_LOCK_KEY = 7_310_001
 
-        # moves
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS moves (
-            id SERIAL PRIMARY KEY,
-            created_at TIMESTAMP DEFAULT NOW(),
-            updated_at TIMESTAMP DEFAULT NOW(),
-            created_by BIGINT,
-            operator_id BIGINT,
-            status TEXT DEFAULT 'draft',
-
-            from_point_id INT REFERENCES points(id),
-            to_point_id INT REFERENCES points(id),
-
-            photo_file_id TEXT,
-
-            invoice_pdf_file_id TEXT,
-
-            note TEXT,
-            invoice_version INT DEFAULT 1,
-
-            handed_at TIMESTAMP,
-            handed_by BIGINT,
-            received_at TIMESTAMP,
-            received_by BIGINT,
-
-            correction_status TEXT DEFAULT 'none',
-            correction_note TEXT,
-            correction_photo_file_id TEXT,
-            correction_by BIGINT,
-            correction_at TIMESTAMP
-        );
-        """)
 
-        # migrations for moves
-        cur.execute("ALTER TABLE moves ADD COLUMN IF NOT EXISTS invoice_pdf_file_id TEXT;")
-
-        # indexes
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_points_city_id ON points(city_id);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_point_users_point_id ON point_users(point_id);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_status ON moves(status);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_created_at ON moves(created_at DESC);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_from_point ON moves(from_point_id);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_to_point ON moves(to_point_id);")
-
-        # move_invoices (history)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS move_invoices (
-            id SERIAL PRIMARY KEY,
-            move_id INT NOT NULL REFERENCES moves(id) ON DELETE CASCADE,
-            version INT NOT NULL,
-            photo_file_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT NOW(),
-            UNIQUE(move_id, version)
-        );
-        """)
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_move_invoices_move_id ON move_invoices(move_id);")
-
-        # move_invoice_photos (multi-photo)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS move_invoice_photos (
-            id SERIAL PRIMARY KEY,
-            move_id INT NOT NULL REFERENCES moves(id) ON DELETE CASCADE,
-            version INT NOT NULL,
-            photo_file_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-        """)
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_move_invoice_photos_move_id ON move_invoice_photos(move_id);")
-
-        # --- MIGRATION: support old column "position" and new "idx" ---
-        # 1) add idx column if missing
-        cur.execute("ALTER TABLE move_invoice_photos ADD COLUMN IF NOT EXISTS idx INT;")
-
-        # 2) if old "position" exists -> copy to idx (position was 0.., idx будемо 1..)
-        cur.execute("""
-        DO $$
-        BEGIN
-          IF EXISTS (
-            SELECT 1 FROM information_schema.columns
-            WHERE table_name='move_invoice_photos' AND column_name='position'
-          ) THEN
-            UPDATE move_invoice_photos
-            SET idx = COALESCE(idx, position + 1)
-            WHERE idx IS NULL;
-          END IF;
-        END $$;
-        """)
+# ---------- MIGRATIONS ----------
+# Кожна міграція: (номер, назва, функція(cur)). Номери тільки зростають,
+# вже застосовані міграції НЕ редагуємо — додаємо нову.
+
+
+def _m0001_baseline(cur):
+    # users
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        telegram_id BIGINT PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        role TEXT DEFAULT 'point',
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+
+    # cities
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS cities (
+        id SERIAL PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    );
+    """)
+
+    # points
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS points (
+        id SERIAL PRIMARY KEY,
+        city_id INT NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        UNIQUE(city_id, name)
+    );
+    """)
+
+    # point_users
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS point_users (
+        telegram_id BIGINT PRIMARY KEY REFERENCES users(telegram_id) ON DELETE CASCADE,
+        point_id INT NOT NULL REFERENCES points(id) ON DELETE CASCADE,
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+
+    # moves
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS moves (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMP DEFAULT NOW(),
+        updated_at TIMESTAMP DEFAULT NOW(),
+        created_by BIGINT,
+        operator_id BIGINT,
+        status TEXT DEFAULT 'draft',
+
+        from_point_id INT REFERENCES points(id),
+        to_point_id INT REFERENCES points(id),
+
+        photo_file_id TEXT,
+
+        invoice_pdf_file_id TEXT,
+
+        note TEXT,
+        invoice_version INT DEFAULT 1,
+
+        handed_at TIMESTAMP,
+        handed_by BIGINT,
+        received_at TIMESTAMP,
+        received_by BIGINT,
+
+        correction_status TEXT DEFAULT 'none',
+        correction_note TEXT,
+        correction_photo_file_id TEXT,
+        correction_by BIGINT,
+        correction_at TIMESTAMP
+    );
+    """)
+
+    # migrations for moves
+    cur.execute("ALTER TABLE moves ADD COLUMN IF NOT EXISTS invoice_pdf_file_id TEXT;")
+
+    # indexes
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_points_city_id ON points(city_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_point_users_point_id ON point_users(point_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_status ON moves(status);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_created_at ON moves(created_at DESC);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_from_point ON moves(from_point_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_to_point ON moves(to_point_id);")
+
+    # move_invoices (history)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS move_invoices (
+        id SERIAL PRIMARY KEY,
+        move_id INT NOT NULL REFERENCES moves(id) ON DELETE CASCADE,
+        version INT NOT NULL,
+        photo_file_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        UNIQUE(move_id, version)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_move_invoices_move_id ON move_invoices(move_id);")
+
+    # move_invoice_photos (multi-photo)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS move_invoice_photos (
+        id SERIAL PRIMARY KEY,
+        move_id INT NOT NULL REFERENCES moves(id) ON DELETE CASCADE,
+        version INT NOT NULL,
+        photo_file_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_move_invoice_photos_move_id ON move_invoice_photos(move_id);")
+
+    # --- MIGRATION: support old column "position" and new "idx" ---
+    # 1) add idx column if missing
+    cur.execute("ALTER TABLE move_invoice_photos ADD COLUMN IF NOT EXISTS idx INT;")
+
+    # 2) if old "position" exists -> copy to idx (position was 0.., idx будемо 1..)
+    cur.execute("""
+    DO $$
+    BEGIN
+      IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name='move_invoice_photos' AND column_name='position'
+      ) THEN
+        UPDATE move_invoice_photos
+        SET idx = COALESCE(idx, position + 1)
+        WHERE idx IS NULL;
+      END IF;
+    END $$;
+    """)
+
+    # 3) fill remaining NULL idx by row_number per (move_id, version)
+    cur.execute("""
+    WITH ranked AS (
+      SELECT id,
+             ROW_NUMBER() OVER (PARTITION BY move_id, version ORDER BY id) AS rn
+      FROM move_invoice_photos
+    )
+    UPDATE move_invoice_photos t
+    SET idx = r.rn
+    FROM ranked r
+    WHERE t.id = r.id AND t.idx IS NULL;
+    """)
+
+    # 4) make idx NOT NULL
+    cur.execute("ALTER TABLE move_invoice_photos ALTER COLUMN idx SET NOT NULL;")
 
-        # 3) fill remaining NULL idx by row_number per (move_id, version)
-        cur.execute("""
-        WITH ranked AS (
-          SELECT id,
-                 ROW_NUMBER() OVER (PARTITION BY move_id, version ORDER BY id) AS rn
-          FROM move_invoice_photos
-        )
-        UPDATE move_invoice_photos t
-        SET idx = r.rn
-        FROM ranked r
-        WHERE t.id = r.id AND t.idx IS NULL;
+    # 5) unique constraint (move_id, version, idx)
+    cur.execute("""
+    DO $$
+    BEGIN
+      IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'move_invoice_photos_unique_mv_ver_idx'
+      ) THEN
+        ALTER TABLE move_invoice_photos
+        ADD CONSTRAINT move_invoice_photos_unique_mv_ver_idx UNIQUE (move_id, version, idx);
+      END IF;
+    END $$;
+    """)
+
+
+def _m0002_outbox(cur):
+    # outbox: вихідні повідомлення Telegram, пишуться в тій самій транзакції, що й зміна стану
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        id BIGSERIAL PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        method TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        kind TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        last_error TEXT,
+        available_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        created_at TIMESTAMP DEFAULT NOW(),
+        sent_at TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(available_at, id) WHERE status = 'pending';")
+
+
+def _m0003_move_deliveries(cur):
+    # move_deliveries: що і кому ми надіслали по переміщенню (останній пакет на людину),
+    # щоб потім редагувати ці повідомлення на місці, а не слати нові
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS move_deliveries (
+        move_id INT NOT NULL REFERENCES moves(id) ON DELETE CASCADE,
+        telegram_id BIGINT NOT NULL,
+        role TEXT NOT NULL,
+        invoice_version INT NOT NULL DEFAULT 1,
+        message_ids BIGINT[] NOT NULL DEFAULT '{}',
+        kb_message_id BIGINT,
+        kb_caption BOOLEAN NOT NULL DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (move_id, telegram_id)
+    );
+    """)
+
+
+def _m0004_outbox_digest(cur):
+    # digest: сповіщення оператору, які зводимо в одне повідомлення за вікно
+    cur.execute("ALTER TABLE outbox ADD COLUMN IF NOT EXISTS digest BOOLEAN NOT NULL DEFAULT FALSE;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_digest ON outbox(chat_id) "
+        "WHERE digest AND status = 'pending';"
+    )
+
+
+def _m0005_fsm_state(cur):
+    # fsm_state: стан/дані aiogram FSM (спільні для всіх інстансів бота, переживають рестарт)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_state (
+        bot_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        thread_id BIGINT NOT NULL DEFAULT 0,
+        business_connection_id TEXT NOT NULL DEFAULT '',
+        destiny TEXT NOT NULL DEFAULT 'default',
+        state TEXT,
+        data JSONB NOT NULL DEFAULT '{}'::jsonb,
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        expires_at TIMESTAMP,
+        PRIMARY KEY (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_expires ON fsm_state(expires_at);")
+
+
+def _m0006_cache_notify(cur):
+    # зміни в довідниках/прив’язках/переміщеннях -> NOTIFY cache_invalidate '<таблиця>:<ключ>'
+    # (слухач в app/db/invalidation.py скидає кеші в усіх інстансах бота)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION notify_cache_invalidate() RETURNS trigger AS $$
+    DECLARE
+        r JSONB;
+    BEGIN
+        FOREACH r IN ARRAY ARRAY[
+            CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END,
+            CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END
+        ] LOOP
+            CONTINUE WHEN r IS NULL;
+            IF TG_TABLE_NAME = 'point_users' THEN
+                PERFORM pg_notify('cache_invalidate',
+                    'point_users:' || (r->>'telegram_id') || ':' || (r->>'point_id'));
+            ELSE
+                -- однаковий payload в одній транзакції Postgres доставляє один раз
+                PERFORM pg_notify('cache_invalidate', TG_TABLE_NAME || ':' || (r->>'id'));
+            END IF;
+        END LOOP;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    for table in ("cities", "points", "point_users", "moves"):
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_cache_notify ON {table};")
+        cur.execute(f"""
+        CREATE TRIGGER trg_{table}_cache_notify
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidate();
         """)
 
-        # 4) make idx NOT NULL
-        cur.execute("ALTER TABLE move_invoice_photos ALTER COLUMN idx SET NOT NULL;")
-
-        # 5) unique constraint (move_id, version, idx)
-        cur.execute("""
-        DO $$
-        BEGIN
-          IF NOT EXISTS (
-            SELECT 1 FROM pg_constraint WHERE conname = 'move_invoice_photos_unique_mv_ver_idx'
-          ) THEN
-            ALTER TABLE move_invoice_photos
-            ADD CONSTRAINT move_invoice_photos_unique_mv_ver_idx UNIQUE (move_id, version, idx);
-          END IF;
-        END $$;
-        """)
\ No newline at end of file
+
+def _m0007_moves_photos_count(cur):
+    # moves.invoice_photos_count — кількість фото поточної версії накладної
+    # (раніше рахувалась COUNT-підзапитом при кожному читанні); ведуть її
+    # ті ж транзакції, що пишуть move_invoice_photos
+    cur.execute("ALTER TABLE moves ADD COLUMN IF NOT EXISTS invoice_photos_count INT NOT NULL DEFAULT 0;")
+    cur.execute("""
+    UPDATE moves m
+    SET invoice_photos_count = c.cnt
+    FROM (
+        SELECT mip.move_id, COUNT(*) AS cnt
+        FROM move_invoice_photos mip
+        JOIN moves mv ON mv.id = mip.move_id AND mip.version = COALESCE(mv.invoice_version, 1)
+        GROUP BY mip.move_id
+    ) c
+    WHERE m.id = c.move_id;
+    """)
+    # обкладинка (photo_file_id) = перше фото поточної версії, якщо є
+    cur.execute("""
+    UPDATE moves m
+    SET photo_file_id = f.photo_file_id
+    FROM (
+        SELECT DISTINCT ON (mip.move_id) mip.move_id, mip.photo_file_id
+        FROM move_invoice_photos mip
+        JOIN moves mv ON mv.id = mip.move_id AND mip.version = COALESCE(mv.invoice_version, 1)
+        ORDER BY mip.move_id, mip.idx
+    ) f
+    WHERE m.id = f.move_id AND m.photo_file_id IS DISTINCT FROM f.photo_file_id;
+    """)
+
+
+def _m0008_moves_list_indexes(cur):
+    # keyset-пагінація списків (moves_repo.list_moves_page): ORDER BY id DESC у межах вкладки
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_moves_active_id ON moves(id DESC)
+    WHERE status NOT IN ('done', 'canceled');
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_moves_closed_id ON moves(id DESC)
+    WHERE status IN ('done', 'canceled');
+    """)
+
+
+def _m0009_moves_no_cache_notify(cur):
+    # moves — найгарячіша таблиця, а кешу рядків moves в процесі нема: pg_notify
+    # там лише серіалізував коміти (NOTIFY бере глобальний лок на commit)
+    cur.execute("DROP TRIGGER IF EXISTS trg_moves_cache_notify ON moves;")
+
+
+MIGRATIONS: list[tuple[int, str, Callable]] = [
+    (1, "baseline", _m0001_baseline),
+    (2, "outbox", _m0002_outbox),
+    (3, "move_deliveries", _m0003_move_deliveries),
+    (4, "outbox_digest", _m0004_outbox_digest),
+    (5, "fsm_state", _m0005_fsm_state),
+    (6, "cache_notify", _m0006_cache_notify),
+    (7, "moves_photos_count", _m0007_moves_photos_count),
+    (8, "moves_list_indexes", _m0008_moves_list_indexes),
+    (9, "moves_no_cache_notify", _m0009_moves_no_cache_notify),
+]
+
+HEAD_VERSION = max(v for v, _, _ in MIGRATIONS)
+
+
+def _current_version(cur) -> int:
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+    return int(cur.fetchone()[0])
+
+
+def migrate() -> int:
+    """
+    Накатує всі ще не застосовані міграції (кожна у своїй транзакції).
+    Викликається один раз на старті з main(). Повертає поточну версію схеми.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # швидкий шлях: схема вже на HEAD
+            if _current_version(cur) >= HEAD_VERSION:
+                return HEAD_VERSION
+
+            cur.execute("SELECT pg_advisory_lock(%s);", (_MIGRATIONS_LOCK_KEY,))
+            try:
+                cur.execute("SELECT version FROM schema_migrations;")
+                applied = {int(r[0]) for r in cur.fetchall()}
+
+                for version, name, apply in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    log.info("Applying migration %04d_%s", version, name)
+                    conn.autocommit = False
+                    try:
+                        apply(cur)
+                        cur.execute(
+                            "INSERT INTO schema_migrations(version, name) VALUES(%s, %s);",
+                            (version, name),
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (_MIGRATIONS_LOCK_KEY,))
+
+    return HEAD_VERSION
+
+
+def ensure_schema() -> int:
+    """Стара назва — лишаємо для сумісності, тепер це просто migrate()."""
+    return migrate()
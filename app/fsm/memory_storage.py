@@ -0,0 +1,139 @@
+# app/fsm/memory_storage.py
+"""
+FSM storage в памʼяті процесу, але обмежений (для одного інстансу).
+
+Покинуті майстри (почав mv:photo_ і не натиснув "Готово", почав pt:corr_ і
+пішов) не живуть вічно:
+- TTL: запис без змін довше за TTL свого стану видаляється
+  (per-state: "MoveStates:waiting_photo" або вся група "MoveStates")
+- LRU: більше max_entries записів — витісняємо найдавніше змінені
+- фоновий sweeper раз на sweep_interval чистить протерміновані і логує лічильники
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+log = logging.getLogger(__name__)
+
+MAX_ENTRIES = 10_000
+STATE_TTL = 24 * 3600
+SWEEP_INTERVAL = 60.0
+
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = 0.0
+
+
+class BoundedMemoryStorage(BaseStorage):
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        ttl: int = STATE_TTL,
+        state_ttls: dict[str, int] | None = None,
+        sweep_interval: float = SWEEP_INTERVAL,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.state_ttls = dict(state_ttls or {})
+        self.sweep_interval = sweep_interval
+        self._entries: OrderedDict[StorageKey, _Entry] = OrderedDict()
+        self._sweeper: asyncio.Task | None = None
+        # метрики
+        self.expired = 0
+        self.evicted = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "expired": self.expired, "evicted": self.evicted}
+
+    def ttl_for(self, state: Optional[str]) -> int:
+        """Точний стан -> група станів (до ':') -> загальний TTL. 0 — без терміну."""
+        if state:
+            if state in self.state_ttls:
+                return self.state_ttls[state]
+            group = state.split(":", 1)[0]
+            if group in self.state_ttls:
+                return self.state_ttls[group]
+        return self.ttl
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        ttl = self.ttl_for(entry.state)
+        return ttl > 0 and now - entry.touched_at >= ttl
+
+    def _get(self, key: StorageKey) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry, time.monotonic()):
+            del self._entries[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def _put(self, key: StorageKey, entry: _Entry) -> None:
+        if entry.state is None and not entry.data:
+            self._entries.pop(key, None)
+            return
+
+        entry.touched_at = time.monotonic()
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="fsm-sweeper")
+
+    # ---------- BaseStorage ----------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = self._get(key) or _Entry()
+        entry.state = state.state if isinstance(state, State) else state
+        self._put(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._get(key)
+        return entry.state if entry else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = self._get(key) or _Entry()
+        entry.data = dict(data)
+        self._put(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._get(key)
+        return dict(entry.data) if entry else {}
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    # ---------- sweeper ----------
+    def sweep(self) -> int:
+        now = time.monotonic()
+        dead = [k for k, e in self._entries.items() if self._expired(e, now)]
+        for k in dead:
+            del self._entries[k]
+        self.expired += len(dead)
+        return len(dead)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                log.info(
+                    "FSM sweep: removed=%s size=%s expired_total=%s evicted_total=%s",
+                    removed, len(self._entries), self.expired, self.evicted,
+                )
@@ -0,0 +1,147 @@
+# app/fsm/pg_storage.py
+"""
+FSM storage на Postgres (таблиця fsm_state): стан майстрів (MoveStates,
+ReinvoiceStates, PointCorrectionStates, ...) переживає рестарт/деплой і
+спільний для кількох інстансів бота.
+
+- write-through: set_state/set_data пишуть у БД до повернення — процес, що
+  впав, нічого не губить, а наступний апдейт на будь-якому інстансі бачить запис
+- читання: з БД (read-through). Кеш читань вмикається тільки cache_ttl > 0 —
+  коли апдейти одного чату гарантовано йдуть в один процес (WORKERS > 1,
+  шардування по chat_id); за балансувальником з кількома інстансами — 0
+- TTL: рядок без змін довше за ttl вважається покинутим і видаляється
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from ..db.aio import fsm_repo
+
+log = logging.getLogger(__name__)
+
+CACHE_TTL = 5.0
+STATE_TTL = 24 * 3600
+PURGE_EVERY = 3600.0
+
+
+@dataclass
+class _Entry:
+    state: Optional[str]
+    data: Dict[str, Any]
+    loaded_at: float
+
+
+def _key(key: StorageKey) -> tuple:
+    return (
+        key.bot_id, key.chat_id, key.user_id,
+        key.thread_id or 0, key.business_connection_id or "", key.destiny,
+    )
+
+
+class PgStorage(BaseStorage):
+    def __init__(self, ttl: int = STATE_TTL, cache_ttl: float = 0.0):
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self._cache: dict[tuple, _Entry] = {}
+        self._purger: asyncio.Task | None = None
+        # метрики
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+        }
+
+    # ---------- cache ----------
+    async def _entry(self, key: StorageKey) -> _Entry:
+        k = _key(key)
+        entry = self._cache.get(k)
+        if entry is not None and time.monotonic() - entry.loaded_at < self.cache_ttl:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        row = await fsm_repo.load(k)
+        entry = _Entry(
+            state=row["state"] if row else None,
+            data=dict(row["data"] or {}) if row else {},
+            loaded_at=time.monotonic(),
+        )
+        if self.cache_ttl > 0:
+            self._cache[k] = entry
+        return entry
+
+    def _remember(self, key: StorageKey, **fields: Any) -> None:
+        """Після запису в БД: оновлюємо кеш (якщо запис уже є), щоб не перечитувати."""
+        entry = self._cache.get(_key(key))
+        if entry is None:
+            return
+        for name, value in fields.items():
+            setattr(entry, name, value)
+        entry.loaded_at = time.monotonic()
+
+    async def _save(self, key: StorageKey, field: str, value: Any) -> None:
+        try:
+            await fsm_repo.save(_key(key), field, value, self.ttl)
+        except Exception:
+            # запис не відбувся — кешу більше не віримо
+            self._cache.pop(_key(key), None)
+            raise
+        self.writes += 1
+        if self._purger is None or self._purger.done():
+            self._purger = asyncio.create_task(self._purge_loop(), name="fsm-purger")
+
+    # ---------- BaseStorage ----------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._save(key, "state", state)
+        self._remember(key, state=state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        data = dict(data)
+        await self._save(key, "data", data)
+        self._remember(key, data=dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._entry(key)).data)
+
+    async def close(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            try:
+                await self._purger
+            except asyncio.CancelledError:
+                pass
+            self._purger = None
+
+    # ---------- обслуговування ----------
+    def _evict(self) -> None:
+        """Записи, старші за cache_ttl, у кеші не тримаємо — вони все одно перечитаються."""
+        now = time.monotonic()
+        stale = [k for k, e in self._cache.items() if now - e.loaded_at >= self.cache_ttl]
+        for k in stale:
+            del self._cache[k]
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(PURGE_EVERY)
+            self._evict()
+            try:
+                purged = await fsm_repo.purge_expired()
+                if purged:
+                    log.info("FSM: purged %s expired states", purged)
+            except Exception:
+                log.exception("FSM purge failed")
@@ -2,15 +2,16 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from ..config import load_config
-from ..db import locations_repo as loc_repo
-from ..db import auth_repo
+from ..db.aio import locations_repo as loc_repo
+from ..db.aio import auth_repo
 from ..keyboards.auth import cities_kb, points_kb, approve_kb
+from ..services.fanout import Fanout, Delivery, text_step
 
 router = Router()
 
 @router.callback_query(F.data == "auth:login_point")
 async def login_point(cb: CallbackQuery):
-    cities = loc_repo.list_cities()
+    cities = await loc_repo.list_cities()
     if not cities:
         await cb.answer("Нема міст. Нехай адмін додасть.", show_alert=True)
         return
@@ -20,7 +21,7 @@ async def login_point(cb: CallbackQuery):
 @router.callback_query(F.data == "auth:change_point")
 async def change_point(cb: CallbackQuery):
     # Це той самий флоу, просто інша кнопка
-    cities = loc_repo.list_cities()
+    cities = await loc_repo.list_cities()
     if not cities:
         await cb.answer("Нема міст. Нехай адмін додасть.", show_alert=True)
         return
@@ -31,7 +32,7 @@ async def change_point(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("auth:city_"))
 async def pick_city(cb: CallbackQuery):
     city_id = int(cb.data.split("_")[-1])
-    points = loc_repo.list_points(city_id)
+    points = await loc_repo.list_points(city_id)
     if not points:
         await cb.answer("В цьому місті нема ТТ.", show_alert=True)
         return
@@ -39,7 +40,7 @@ async def pick_city(cb: CallbackQuery):
     await cb.answer()
 
 @router.callback_query(F.data.startswith("auth:point_"))
-async def request_link(cb: CallbackQuery):
+async def request_link(cb: CallbackQuery, fanout: Fanout):
     point_id = int(cb.data.split("_")[-1])
 
     u = cb.from_user
@@ -60,13 +61,9 @@ async def request_link(cb: CallbackQuery):
     kb = approve_kb(u.id, point_id)
 
     # зафіксуємо дані користувача в users (щоб адмін бачив username/ім'я)
-    auth_repo.upsert_user(u.id, u.username, u.full_name, role="point")
+    await auth_repo.upsert_user(u.id, u.username, u.full_name, role="point")
 
-    for admin_id in cfg.admins_set:
-        try:
-            await cb.bot.send_message(admin_id, text, reply_markup=kb)
-        except Exception:
-            pass
+    await fanout.run(cb.bot, [Delivery(admin_id, [text_step(text, reply_markup=kb)]) for admin_id in cfg.admins_set])
 
     await cb.message.edit_text("✅ Запит відправлено адмінам. Чекай підтвердження.")
     await cb.answer()
@@ -80,7 +77,7 @@ async def approve(cb: CallbackQuery):
     point_id = int(point_id_str)
 
     # прив'язка (можна скільки завгодно людей до однієї ТТ)
-    auth_repo.link_user_to_point(user_id, point_id, username=None, full_name=None)
+    await auth_repo.link_user_to_point(user_id, point_id, username=None, full_name=None)
 
     await cb.answer("✅ Прив’язано", show_alert=True)
     await cb.message.edit_text("✅ Прив’язку підтверджено.")
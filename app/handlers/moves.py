@@ -1,24 +1,20 @@
 # app/handlers/moves.py
 import logging
-import traceback
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InputMediaPhoto
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import (
-    TelegramBadRequest,
-    TelegramForbiddenError,
-    TelegramRetryAfter,
-)
+from aiogram.exceptions import TelegramBadRequest
 
-from ..db import locations_repo as loc_repo
-from ..db import moves_repo as mv_repo
-from ..db import auth_repo
+from ..db.aio import locations_repo as loc_repo
+from ..db.aio import moves_repo as mv_repo
+from ..db.aio import auth_repo
 
 from ..states.moves import MoveStates
 from ..keyboards.moves import (
     moves_menu_kb,
+    moves_list_kb,
     cities_kb,
     points_kb,
     move_review_kb,
@@ -28,7 +24,8 @@ from ..keyboards.moves import (
     mv_photos_done_kb,
     mv_pdf_done_kb,
 )
-from ..utils.text import move_text
+from ..utils.text import move_text, attachments_badge
+from ..services.fanout import Fanout, Delivery, Step, album_step, document_step, text_step, count_ok
 
 router = Router()
 log = logging.getLogger(__name__)
@@ -42,6 +39,7 @@ STATUS_UA = {
 
 TELEGRAM_LIMIT = 3900
 PM = "HTML"
+MAX_PHOTOS = 10
 
 
 def split_text(text: str, limit: int = TELEGRAM_LIMIT) -> list[str]:
@@ -86,53 +84,24 @@ def _extract_pdf_file_id(message: Message) -> str | None:
     return None
 
 
-async def _send_invoice_package(bot, uid: int, photos: list[str], pdf_file_id: str | None, caption: str, kb):
+def _invoice_package_steps(photos: list[str], pdf_file_id: str | None, caption: str) -> list[Step]:
     """
-    Відправляє вкладення (фото альбомом і/або pdf) + 1 повідомлення з кнопками.
-    Додаємо детальні логи, щоб зрозуміти чому "не надсилається".
+    Спільні для всіх ТТ вкладення: фото альбомом і/або pdf.
+    Кнопки кожен отримувач отримує окремим повідомленням (_confirm_steps).
     """
-    try:
-        sent_any = False
+    steps: list[Step] = []
 
-        log.info("SEND pkg uid=%s photos=%s pdf=%s", uid, len(photos), bool(pdf_file_id))
+    if photos:
+        steps.append(album_step(photos, caption=caption))
 
-        if photos:
-            if len(photos) == 1:
-                await bot.send_photo(uid, photo=photos[0], caption=caption, parse_mode=PM)
-            else:
-                media = [InputMediaPhoto(media=fid) for fid in photos]
-                media[0].caption = caption
-                media[0].parse_mode = PM
-                await bot.send_media_group(uid, media=media)
-            sent_any = True
+    if pdf_file_id:
+        steps.append(document_step(pdf_file_id, caption=caption if not photos else "📄 PDF накладної"))
+
+    return steps
 
-        if pdf_file_id:
-            if not photos:
-                await bot.send_document(uid, document=pdf_file_id, caption=caption, parse_mode=PM)
-            else:
-                await bot.send_document(uid, document=pdf_file_id, caption="📄 PDF накладної", parse_mode=PM)
-            sent_any = True
-
-        if not sent_any:
-            log.warning("SEND pkg uid=%s: nothing to send (no photos, no pdf)", uid)
-            return False
-
-        await bot.send_message(uid, "✅ Підтверди дію кнопками нижче:", reply_markup=kb, parse_mode=PM)
-        return True
-
-    except TelegramRetryAfter as e:
-        log.error("SEND FAIL uid=%s flood_wait=%s", uid, getattr(e, "retry_after", None))
-        return False
-    except TelegramForbiddenError as e:
-        log.error("SEND FAIL uid=%s forbidden: %s", uid, str(e))
-        return False
-    except TelegramBadRequest as e:
-        # тут найчастіше: wrong file_id, chat not found, can't parse entities, etc.
-        log.error("SEND FAIL uid=%s bad_request: %s", uid, str(e))
-        return False
-    except Exception as e:
-        log.error("SEND FAIL uid=%s unknown: %s\n%s", uid, str(e), traceback.format_exc())
-        return False
+
+def _confirm_steps(kb) -> list[Step]:
+    return [text_step("✅ Підтверди дію кнопками нижче:", reply_markup=kb)]
 
 
 async def _send_invoice_to_operator(message: Message, move_id: int, m: dict):
@@ -145,7 +114,7 @@ async def _send_invoice_to_operator(message: Message, move_id: int, m: dict):
 
     v = int(m.get("invoice_version") or 1)
     try:
-        photos = mv_repo.list_invoice_photos(move_id, v)
+        photos = await mv_repo.list_invoice_photos(move_id, v)
     except Exception:
         photos = []
 
@@ -182,26 +151,35 @@ async def mv_menu(cb: CallbackQuery, state: FSMContext):
     await cb.answer()
 
 
-@router.callback_query(F.data == "mv:list")
-async def mv_list(cb: CallbackQuery):
-    items = mv_repo.list_moves(50)
-    if not items:
-        await safe_edit(cb.message, "Поки переміщень нема.", reply_markup=moves_menu_kb())
-        await cb.answer()
-        return
-
+def _moves_list_text(items: list[dict], footer: str) -> str:
     lines = ["📋 <b>Останні переміщення:</b>"]
     for m in items:
         fp = m.get("from_point_name") or "—"
         tp = m.get("to_point_name") or "—"
         st_raw = (m.get("status") or "").lower()
         st = STATUS_UA.get(st_raw, m.get("status") or "—")
-        lines.append(f"• <b>#{m['id']}</b> ({st}) {fp} → {tp}")
+        lines.append(f"• <b>#{m['id']}</b> ({st}) {fp} → {tp}{attachments_badge(m)}")
+    lines.append(footer)
+    return "\n".join(lines)
 
-    lines.append("\nКоманда: <code>/info ID</code>")
-    chunks = split_text("\n".join(lines))
 
-    await safe_edit(cb.message, chunks[0], reply_markup=moves_menu_kb())
+@router.callback_query(F.data == "mv:list")
+@router.callback_query(F.data.startswith("mv:list:"))
+async def mv_list(cb: CallbackQuery, moves_page_size: int):
+    # mv:list — перша сторінка, mv:list:<p|n>:<cursor> — ◀️/▶️
+    parts = cb.data.split(":")
+    cursor = int(parts[3]) if len(parts) == 4 else None
+    direction = "prev" if len(parts) == 4 and parts[2] == "p" else "next"
+
+    page = await mv_repo.list_moves_page("all", cursor, direction, moves_page_size)
+    if not page["items"]:
+        await safe_edit(cb.message, "Поки переміщень нема.", reply_markup=moves_menu_kb())
+        await cb.answer()
+        return
+
+    chunks = split_text(_moves_list_text(page["items"], "\nКоманда: <code>/info ID</code>"))
+
+    await safe_edit(cb.message, chunks[0], reply_markup=moves_list_kb(page))
     for extra in chunks[1:]:
         await cb.message.answer(extra, parse_mode=PM)
 
@@ -211,15 +189,15 @@ async def mv_list(cb: CallbackQuery):
 # ---------- create new move flow ----------
 @router.callback_query(F.data == "mv:new")
 async def mv_new(cb: CallbackQuery, state: FSMContext):
-    move_id = mv_repo.create_move(created_by=cb.from_user.id)
+    move_id = await mv_repo.create_move(created_by=cb.from_user.id)
     try:
-        mv_repo.set_operator(move_id, cb.from_user.id)
+        await mv_repo.set_operator(move_id, cb.from_user.id)
     except Exception:
         log.exception("set_operator failed for move_id=%s", move_id)
 
     await state.update_data(move_id=move_id)
 
-    cities = loc_repo.list_cities()
+    cities = await loc_repo.list_cities()
     if not cities:
         await safe_edit(cb.message, "Спочатку додай міста/ТТ у модулі локацій.")
         await cb.answer()
@@ -239,7 +217,7 @@ async def mv_from_city(cb: CallbackQuery, state: FSMContext):
     city_id = int(cb.data.split("_")[-1])
     await state.update_data(from_city_id=city_id)
 
-    points = loc_repo.list_points(city_id)
+    points = await loc_repo.list_points(city_id)
     if not points:
         await cb.answer("У місті немає ТТ.", show_alert=True)
         return
@@ -258,13 +236,13 @@ async def mv_from_point(cb: CallbackQuery, state: FSMContext):
     point_id = int(cb.data.split("_")[-1])
     move_id = int((await state.get_data())["move_id"])
 
-    mv_repo.set_from_point(move_id, point_id)
+    await mv_repo.set_from_point(move_id, point_id)
 
     await state.set_state(MoveStates.choosing_to_city)
     await safe_edit(
         cb.message,
         "Тепер вибери <b>місто (КУДИ)</b>:",
-        reply_markup=cities_kb(loc_repo.list_cities(), "mv:to_city_", back_cb="mv:menu"),
+        reply_markup=cities_kb(await loc_repo.list_cities(), "mv:to_city_", back_cb="mv:menu"),
     )
     await cb.answer()
 
@@ -274,7 +252,7 @@ async def mv_to_city(cb: CallbackQuery, state: FSMContext):
     city_id = int(cb.data.split("_")[-1])
     await state.update_data(to_city_id=city_id)
 
-    points = loc_repo.list_points(city_id)
+    points = await loc_repo.list_points(city_id)
     if not points:
         await cb.answer("У місті немає ТТ.", show_alert=True)
         return
@@ -293,10 +271,12 @@ async def mv_to_point(cb: CallbackQuery, state: FSMContext):
     point_id = int(cb.data.split("_")[-1])
     move_id = int((await state.get_data())["move_id"])
 
-    mv_repo.set_to_point(move_id, point_id)
-
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.set_to_point(move_id, point_id)
     await state.clear()
+    if not m:
+        await cb.answer("❌ Переміщення не знайдено", show_alert=True)
+        return
+
     await safe_edit(
         cb.message,
         "✅ Маршрут зібраний.\n\n" + move_text(m),
@@ -310,10 +290,10 @@ async def mv_to_point(cb: CallbackQuery, state: FSMContext):
 async def mv_photo_start(cb: CallbackQuery, state: FSMContext):
     move_id = int(cb.data.split("_")[-1])
 
-    await state.update_data(move_id=move_id, media_groups_seen=[])
+    await state.update_data(move_id=move_id)
     await state.set_state(MoveStates.waiting_photos)
 
-    v = mv_repo.get_invoice_version(move_id)
+    v = await mv_repo.get_invoice_version(move_id)
     text = (
         f"📷 <b>Накладна для #{move_id}</b> (V{v})\n\n"
         "Надсилай фото накладної (1…10 фото, по одному або альбомом).\n"
@@ -330,7 +310,7 @@ async def mv_photo_cancel(cb: CallbackQuery, state: FSMContext):
     move_id = int((await state.get_data()).get("move_id") or cb.data.split("_")[-1])
     await state.clear()
 
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     await cb.message.answer("❌ Ок, додавання фото скасовано.", parse_mode=PM)
     if m:
         await cb.message.answer(move_text(m), reply_markup=move_review_kb(move_id), parse_mode=PM)
@@ -338,9 +318,10 @@ async def mv_photo_cancel(cb: CallbackQuery, state: FSMContext):
 
 
 @router.message(MoveStates.waiting_photos)
-async def mv_photo_collect(message: Message, state: FSMContext):
-    file_id = _extract_photo_file_id(message)
-    if not file_id:
+async def mv_photo_collect(message: Message, state: FSMContext, album: list[Message] | None = None):
+    # album — всі частини media group одним викликом (AlbumMiddleware)
+    file_ids = [fid for fid in map(_extract_photo_file_id, album or [message]) if fid]
+    if not file_ids:
         return await message.answer("⚠️ Надішли саме фото/картинку. Потім натисни ✅ Готово.", parse_mode=PM)
 
     data = await state.get_data()
@@ -349,42 +330,35 @@ async def mv_photo_collect(message: Message, state: FSMContext):
         await state.clear()
         return await message.answer("⚠️ Не знайшов move_id. Зайди ще раз в 📷 Додати фото.", parse_mode=PM)
 
-    v = mv_repo.get_invoice_version(move_id)
-
+    # ✅ дописуємо тільки нові фото (idx = max+1..), без перезапису всього списку
     try:
-        current = mv_repo.list_invoice_photos(move_id, v)
+        res = await mv_repo.append_invoice_photos(move_id, file_ids, limit=MAX_PHOTOS)
     except Exception:
-        current = []
+        log.exception("Failed to save invoice photos for move_id=%s", move_id)
+        return await message.answer("❌ Не вдалося зберегти фото. Спробуй ще раз.", parse_mode=PM)
 
-    if file_id not in current:
-        current.append(file_id)
+    if not res:
+        await state.clear()
+        return await message.answer("❌ Переміщення не знайдено.", parse_mode=PM)
 
-    if len(current) > 10:
-        return await message.answer("⚠️ Максимум 10 фото для 1 накладної.", parse_mode=PM)
+    if res["over_limit"]:
+        return await message.answer(
+            f"⚠️ Максимум {MAX_PHOTOS} фото для 1 накладної.\n"
+            f"Збережено: <b>{res['added']}</b>, не влізло: <b>{res['overflow']}</b>.\n"
+            f"Фото в накладній: <b>{res['count']}</b>. Натисни ✅ <b>Готово</b>.",
+            parse_mode=PM,
+        )
 
-    try:
-        mv_repo.set_photo(move_id, current[0])
-        mv_repo.add_invoice_photos(move_id, v, current)
-    except Exception:
-        log.exception("Failed to save invoice photos for move_id=%s v=%s", move_id, v)
-
-    media_groups_seen: list[str] = data.get("media_groups_seen", [])
-
-    if message.media_group_id:
-        mg = str(message.media_group_id)
-        if mg not in media_groups_seen:
-            media_groups_seen.append(mg)
-            await state.update_data(media_groups_seen=media_groups_seen)
-            return await message.answer(
-                "📎 Альбом прийнято ✅\n"
-                f"Фото в накладній: <b>{len(current)}</b>\n"
-                "Можеш додати ще або натиснути ✅ <b>Готово</b>.",
-                parse_mode=PM,
-            )
-        return
+    if album:
+        return await message.answer(
+            "📎 Альбом прийнято ✅\n"
+            f"Фото в накладній: <b>{res['count']}</b>\n"
+            "Можеш додати ще або натиснути ✅ <b>Готово</b>.",
+            parse_mode=PM,
+        )
 
     await message.answer(
-        f"✅ Додано фото: <b>{len(current)}</b>\n"
+        f"✅ Додано фото: <b>{res['count']}</b>\n"
         "Можеш додати ще або натиснути ✅ <b>Готово</b>.",
         parse_mode=PM,
     )
@@ -394,22 +368,19 @@ async def mv_photo_collect(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("mv:photos_done_"))
 async def mv_photo_done(cb: CallbackQuery, state: FSMContext):
     move_id = int((await state.get_data()).get("move_id") or cb.data.split("_")[-1])
-    v = mv_repo.get_invoice_version(move_id)
-
-    try:
-        photos = mv_repo.list_invoice_photos(move_id, v)
-    except Exception:
-        photos = []
+    # кількість фото поточної версії — вже в рядку move (invoice_photos_count)
+    m = await mv_repo.get_move(move_id)
+    count = int((m or {}).get("invoice_photos_count") or 0)
 
-    if not photos:
+    if not count:
         await cb.answer("Спочатку додай хоча б 1 фото.", show_alert=True)
         return
 
     await state.clear()
-    m = mv_repo.get_move(move_id)
+    v = int(m.get("invoice_version") or 1)
 
     await cb.message.answer(
-        f"✅ Фото накладної збережено: <b>{len(photos)}</b> фото (V{v})\n\n" + move_text(m),
+        f"✅ Фото накладної збережено: <b>{count}</b> фото (V{v})\n\n" + move_text(m),
         reply_markup=move_review_kb(move_id),
         parse_mode=PM,
     )
@@ -467,14 +438,16 @@ async def mv_pdf_done(cb: CallbackQuery, state: FSMContext):
         return
 
     try:
-        mv_repo.set_invoice_pdf(move_id, pdf_id)
+        m = await mv_repo.set_invoice_pdf(move_id, pdf_id)
     except Exception:
         log.exception("Failed to save invoice pdf for move_id=%s", move_id)
         await cb.answer("❌ Не вдалося зберегти PDF. Дивись логи.", show_alert=True)
         return
 
     await state.clear()
-    m = mv_repo.get_move(move_id)
+    if not m:
+        await cb.answer("❌ Переміщення не знайдено", show_alert=True)
+        return
 
     await cb.message.answer(
         "✅ PDF накладної збережено.\n\n" + move_text(m),
@@ -489,14 +462,16 @@ async def mv_pdf_clear(cb: CallbackQuery, state: FSMContext):
     move_id = int(cb.data.split("_")[-1])
 
     try:
-        mv_repo.set_invoice_pdf(move_id, None)
+        m = await mv_repo.clear_invoice_pdf(move_id)
     except Exception:
         log.exception("Failed to clear invoice pdf for move_id=%s", move_id)
         await cb.answer("❌ Не вдалося прибрати PDF. Дивись логи.", show_alert=True)
         return
 
     await state.clear()
-    m = mv_repo.get_move(move_id)
+    if not m:
+        await cb.answer("❌ Переміщення не знайдено", show_alert=True)
+        return
 
     await cb.message.answer(
         "🗑 PDF прибрано.\n\n" + move_text(m),
@@ -511,7 +486,7 @@ async def mv_pdf_cancel(cb: CallbackQuery, state: FSMContext):
     move_id = int(cb.data.split("_")[-1])
     await state.clear()
 
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     await cb.message.answer("❌ Ок, додавання PDF скасовано.", parse_mode=PM)
     if m:
         await cb.message.answer(move_text(m), reply_markup=move_review_kb(move_id), parse_mode=PM)
@@ -546,18 +521,20 @@ async def mv_note_collect(message: Message, state: FSMContext):
         return await message.answer("Напиши текстом або <code>-</code> щоб прибрати.", parse_mode=PM)
 
     if text == "-":
-        mv_repo.set_note(move_id, "")
+        m = await mv_repo.set_note(move_id, "")
         await state.clear()
-        m = mv_repo.get_move(move_id)
+        if not m:
+            return await message.answer("❌ Переміщення не знайдено", parse_mode=PM)
         return await message.answer(
             "🗑 Коментар прибрано.\n\n" + move_text(m),
             reply_markup=move_review_kb(move_id),
             parse_mode=PM,
         )
 
-    mv_repo.set_note(move_id, text)
+    m = await mv_repo.set_note(move_id, text)
     await state.clear()
-    m = mv_repo.get_move(move_id)
+    if not m:
+        return await message.answer("❌ Переміщення не знайдено", parse_mode=PM)
     await message.answer(
         "✅ Коментар збережено.\n\n" + move_text(m),
         reply_markup=move_review_kb(move_id),
@@ -567,9 +544,9 @@ async def mv_note_collect(message: Message, state: FSMContext):
 
 # ---------- send / cancel / done ----------
 @router.callback_query(F.data.startswith("mv:send_"))
-async def mv_send(cb: CallbackQuery):
+async def mv_send(cb: CallbackQuery, fanout: Fanout):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         await cb.answer("Не знайдено.", show_alert=True)
         return
@@ -579,15 +556,12 @@ async def mv_send(cb: CallbackQuery):
         return
 
     try:
-        mv_repo.clear_hand_receive(move_id)
+        await mv_repo.clear_hand_receive(move_id)
     except Exception:
         log.exception("clear_hand_receive failed for move_id=%s", move_id)
 
-    from_users = auth_repo.get_point_users(int(m["from_point_id"]))
-    to_users = auth_repo.get_point_users(int(m["to_point_id"]))
-
-    from_rec = [u["telegram_id"] for u in from_users if u.get("telegram_id")]
-    to_rec = [u["telegram_id"] for u in to_users if u.get("telegram_id")]
+    from_rec = await auth_repo.get_point_recipients(int(m["from_point_id"]))
+    to_rec = await auth_repo.get_point_recipients(int(m["to_point_id"]))
 
     if not from_rec or not to_rec:
         await cb.answer(
@@ -599,7 +573,7 @@ async def mv_send(cb: CallbackQuery):
 
     v = int((m.get("invoice_version") or 1))
     try:
-        photos = mv_repo.list_invoice_photos(move_id, v)
+        photos = await mv_repo.list_invoice_photos(move_id, v)
     except Exception:
         photos = []
 
@@ -617,27 +591,37 @@ async def mv_send(cb: CallbackQuery):
         await cb.answer("⚠️ Нема ні фото, ні PDF накладної. Додай перед відправкою.", show_alert=True)
         return
 
-    mv_repo.set_status(move_id, "sent")
-    m = mv_repo.get_move(move_id) or m
+    m = await mv_repo.set_status(move_id, "sent") or m
 
     caption = f"📣 <b>Переміщення #{move_id}</b> (V{v})\n\n" + move_text(m)
 
-    sent_from = 0
-    sent_to = 0
+    # пакет один для всіх (в режимі copy — одне завантаження + copy_messages), кнопки — свої
+    deliveries = [
+        Delivery(uid, _confirm_steps(point_from_kb(move_id)), tag="from") for uid in from_rec
+    ] + [
+        Delivery(uid, _confirm_steps(point_to_kb(move_id)), tag="to") for uid in to_rec
+    ]
+    results = await fanout.run_package(
+        cb.bot,
+        _invoice_package_steps(photos, pdf_id, caption),
+        deliveries,
+        staging_chat_id=m.get("operator_id") or cb.from_user.id,
+    )
 
-    for uid in from_rec:
-        ok = await _send_invoice_package(cb.bot, uid, photos, pdf_id, caption, point_from_kb(move_id))
-        if ok:
-            sent_from += 1
-        else:
-            log.error("SEND FAIL to FROM uid=%s move_id=%s", uid, move_id)
+    for r in results:
+        if not r.ok:
+            log.error("SEND FAIL to %s uid=%s move_id=%s: %s", r.tag.upper(), r.chat_id, move_id, r.error)
 
-    for uid in to_rec:
-        ok = await _send_invoice_package(cb.bot, uid, photos, pdf_id, caption, point_to_kb(move_id))
-        if ok:
-            sent_to += 1
-        else:
-            log.error("SEND FAIL to TO uid=%s move_id=%s", uid, move_id)
+    # ledger: кому і які message_id пішли — далі редагуємо їх на місці (закриття / реінвойс)
+    try:
+        await mv_repo.record_deliveries(move_id, v, [
+            {"telegram_id": r.chat_id, "role": r.tag, "message_ids": r.message_ids} for r in results if r.ok
+        ])
+    except Exception:
+        log.exception("record_deliveries failed for move_id=%s", move_id)
+
+    sent_from = count_ok(results, "from")
+    sent_to = count_ok(results, "to")
 
     operator_id = m.get("operator_id") or cb.from_user.id
     try:
@@ -666,9 +650,8 @@ async def mv_send(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("mv:cancel_"))
 async def mv_cancel(cb: CallbackQuery):
     move_id = int(cb.data.split("_")[-1])
-    ok = mv_repo.set_status(move_id, "canceled")
-    await cb.answer("🗑 Скасовано" if ok else "⚠️ Не знайдено", show_alert=True)
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.set_status(move_id, "canceled")
+    await cb.answer("🗑 Скасовано" if m else "⚠️ Не знайдено", show_alert=True)
     if m:
         await safe_edit(cb.message, move_text(m), reply_markup=moves_menu_kb())
 
@@ -676,31 +659,23 @@ async def mv_cancel(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("mv:done_"))
 async def mv_done(cb: CallbackQuery):
     move_id = int(cb.data.split("_")[-1])
-    ok = mv_repo.set_status(move_id, "done")
-    await cb.answer("✅ Завершено" if ok else "⚠️ Не знайдено", show_alert=True)
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.set_status(move_id, "done")
+    await cb.answer("✅ Завершено" if m else "⚠️ Не знайдено", show_alert=True)
     if m:
         await safe_edit(cb.message, move_text(m), reply_markup=moves_menu_kb())
 
 
 # ---------- commands ----------
 @router.message(Command("moves"))
-async def cmd_moves(message: Message):
-    items = mv_repo.list_moves(50)
-    if not items:
+async def cmd_moves(message: Message, moves_page_size: int):
+    page = await mv_repo.list_moves_page("all", limit=moves_page_size)
+    if not page["items"]:
         return await message.answer("Поки переміщень нема.", parse_mode=PM)
 
-    lines = ["📋 <b>Останні переміщення:</b>"]
-    for m in items:
-        fp = m.get("from_point_name") or "—"
-        tp = m.get("to_point_name") or "—"
-        st_raw = (m.get("status") or "").lower()
-        st = STATUS_UA.get(st_raw, m.get("status") or "—")
-        lines.append(f"• <b>#{m['id']}</b> ({st}) {fp} → {tp}")
-
-    lines.append("\nДетально: <code>/info ID</code>")
-    for chunk in split_text("\n".join(lines)):
-        await message.answer(chunk, parse_mode=PM)
+    chunks = split_text(_moves_list_text(page["items"], "\nДетально: <code>/info ID</code>"))
+    for i, chunk in enumerate(chunks):
+        kb = moves_list_kb(page) if i == len(chunks) - 1 else None
+        await message.answer(chunk, reply_markup=kb, parse_mode=PM)
 
 
 @router.message(Command("info"))
@@ -709,7 +684,7 @@ async def cmd_info(message: Message):
     if len(parts) < 2 or not parts[1].isdigit():
         return await message.answer("Формат: <code>/info 123</code>", parse_mode=PM)
     move_id = int(parts[1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         return await message.answer("Не знайдено.", parse_mode=PM)
 
@@ -7,8 +7,7 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from ..db import moves_repo as mv_repo
-from ..db import auth_repo
+from ..db.aio import moves_repo as mv_repo
 from ..keyboards.moves import (
     admin_moves_tabs_kb,
     admin_moves_list_kb,
@@ -18,6 +17,8 @@ from ..keyboards.moves import (
     point_to_kb,
 )
 from ..utils.text import move_text
+from ..services.outbox import OutboxWorker, outbox_message, outbox_edit
+from ..services.fanout import Fanout, Delivery, Step, album_step, photo_step, text_step, count_ok
 
 router = Router()
 PM = "HTML"
@@ -49,30 +50,6 @@ async def safe_edit(cb: CallbackQuery, text: str, reply_markup=None):
         raise
 
 
-def _uniq(ids: list[int]) -> list[int]:
-    seen = set()
-    out: list[int] = []
-    for x in ids:
-        if x not in seen:
-            seen.add(x)
-            out.append(x)
-    return out
-
-
-def _participants_ids(m: dict) -> list[int]:
-    """Учасники = всі люди прив’язані до ТТ-відправника + ТТ-отримувача"""
-    from_pid = m.get("from_point_id")
-    to_pid = m.get("to_point_id")
-
-    ids: list[int] = []
-    if from_pid:
-        ids += [u["telegram_id"] for u in auth_repo.get_point_users(int(from_pid)) if u.get("telegram_id")]
-    if to_pid:
-        ids += [u["telegram_id"] for u in auth_repo.get_point_users(int(to_pid)) if u.get("telegram_id")]
-
-    return _uniq(ids)
-
-
 async def _send_album_or_single_to_me(cb: CallbackQuery, photos: list[str], caption: str) -> None:
     """Оператору/адміну: 1 фото -> send_photo, 2+ -> send_media_group"""
     if not photos:
@@ -109,70 +86,76 @@ async def _send_pdf_to_me(cb: CallbackQuery, pdf_file_id: str, caption: str) ->
         await cb.bot.send_message(cb.from_user.id, caption + "\n\n⚠️ Не зміг надіслати PDF.", parse_mode=PM)
 
 
-async def _send_album_or_single_to_tt(bot, uid: int, photos: list[str], caption: str, kb):
+def _tt_album_steps(photos: list[str], caption: str, kb) -> list[Step]:
     """
     На ТТ:
     - 1 фото: send_photo з kb
     - 2+: send_media_group + ОДНЕ окреме повідомлення з kb
     """
     if not photos:
-        return False
-    try:
-        if len(photos) == 1:
-            await bot.send_photo(uid, photo=photos[0], caption=caption, reply_markup=kb, parse_mode=PM)
-        else:
-            media = [InputMediaPhoto(media=fid) for fid in photos]
-            media[0].caption = caption
-            media[0].parse_mode = PM
-            await bot.send_media_group(uid, media=media)
-            await bot.send_message(uid, "✅ Підтверди дію кнопками нижче:", reply_markup=kb, parse_mode=PM)
-        return True
-    except Exception:
-        return False
+        return []
+    if len(photos) == 1:
+        return [photo_step(photos[0], caption=caption, reply_markup=kb)]
+    return [
+        album_step(photos, caption=caption),
+        text_step("✅ Підтверди дію кнопками нижче:", reply_markup=kb),
+    ]
 
 
 # -------------------- LIST / VIEW --------------------
+# вкладка -> (заголовок, текст для порожнього списку, активна вкладка в tabs)
+_LIST_TABS = {
+    "active": ("🟢 <b>Активні переміщення:</b>", "🟢 Активних переміщень нема.", True),
+    "closed": ("✅ <b>Завершені переміщення:</b>", "✅ Завершених переміщень нема.", False),
+}
+
+
+async def _show_list(
+    cb: CallbackQuery, scope: str, page_size: int,
+    cursor: int | None = None, direction: str = "next", answer: bool = True,
+):
+    page = await mv_repo.list_moves_page(scope, cursor, direction, page_size)
+    title, empty, active = _LIST_TABS[scope]
+    if not page["items"]:
+        await safe_edit(cb, empty, reply_markup=admin_moves_tabs_kb(active))
+    else:
+        await safe_edit(
+            cb,
+            title,
+            reply_markup=admin_moves_list_kb(page["items"], f"mva:{scope}", page=page, page_cb=f"mva:pg:{scope}"),
+        )
+    if answer:
+        await cb.answer()
+
+
 @router.callback_query(F.data == "mva:list")
-async def mva_list(cb: CallbackQuery):
-    await mva_active(cb)
+async def mva_list(cb: CallbackQuery, moves_page_size: int):
+    await _show_list(cb, "active", moves_page_size)
 
 
 @router.callback_query(F.data == "mva:active")
-async def mva_active(cb: CallbackQuery):
-    items = mv_repo.list_moves_active(50)
-    if not items:
-        await safe_edit(cb, "🟢 Активних переміщень нема.", reply_markup=admin_moves_tabs_kb(True))
-        await cb.answer()
-        return
-
-    await safe_edit(
-        cb,
-        "🟢 <b>Активні переміщення:</b>",
-        reply_markup=admin_moves_list_kb(items, "mva:active"),
-    )
-    await cb.answer()
+async def mva_active(cb: CallbackQuery, moves_page_size: int):
+    await _show_list(cb, "active", moves_page_size)
 
 
 @router.callback_query(F.data == "mva:closed")
-async def mva_closed(cb: CallbackQuery):
-    items = mv_repo.list_moves_closed(30)
-    if not items:
-        await safe_edit(cb, "✅ Завершених переміщень нема.", reply_markup=admin_moves_tabs_kb(False))
-        await cb.answer()
-        return
+async def mva_closed(cb: CallbackQuery, moves_page_size: int):
+    await _show_list(cb, "closed", moves_page_size)
 
-    await safe_edit(
-        cb,
-        "✅ <b>Завершені переміщення (останні):</b>",
-        reply_markup=admin_moves_list_kb(items, "mva:closed"),
-    )
-    await cb.answer()
+
+@router.callback_query(F.data.startswith("mva:pg:"))
+async def mva_page(cb: CallbackQuery, moves_page_size: int):
+    # mva:pg:<scope>:<p|n>:<cursor>
+    _, _, scope, direction, cursor = cb.data.split(":")
+    if scope not in _LIST_TABS:
+        return await cb.answer()
+    await _show_list(cb, scope, moves_page_size, int(cursor), "prev" if direction == "p" else "next")
 
 
 @router.callback_query(F.data.startswith("mva:view_"))
 async def mva_view(cb: CallbackQuery):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         await cb.answer("Не знайдено.", show_alert=True)
         return
@@ -190,7 +173,7 @@ async def mva_view(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("mva:docs_"))
 async def mva_docs(cb: CallbackQuery):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         await cb.answer("Не знайдено.", show_alert=True)
         return
@@ -202,7 +185,7 @@ async def mva_docs(cb: CallbackQuery):
 
     # 1) всі версії фото
     try:
-        invoices = mv_repo.list_invoices(move_id)
+        invoices = await mv_repo.list_invoices(move_id)
     except Exception:
         invoices = []
 
@@ -216,7 +199,7 @@ async def mva_docs(cb: CallbackQuery):
         v = int(inv.get("version") or 1)
 
         try:
-            photos = mv_repo.list_invoice_photos(move_id, v)
+            photos = await mv_repo.list_invoice_photos(move_id, v)
         except Exception:
             photos = []
 
@@ -240,41 +223,48 @@ async def mva_docs(cb: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("mva:close_"))
-async def mva_close(cb: CallbackQuery):
+async def mva_close(cb: CallbackQuery, outbox: OutboxWorker, moves_page_size: int):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+
+    def notify(m: dict) -> list[dict]:
+        msg = (
+            "✅ <b>Переміщення закрито оператором</b>\n"
+            f"🆔 ID: <b>{move_id}</b>\n\n"
+            f"📤 Відправник: <b>{m.get('from_point_name') or '—'}</b>\n"
+            f"📥 Отримувач: <b>{m.get('to_point_name') or '—'}</b>\n"
+        )
+        participants = m["participants"]
+        delivered = {int(d["telegram_id"]): d for d in m["deliveries"] if d.get("kb_message_id")}
+
+        # хто вже має пакет — редагуємо повідомлення з кнопками (і прибираємо їх), решті — нове
+        msgs = []
+        for uid in participants + [uid for uid in delivered if uid not in participants]:
+            d = delivered.get(int(uid))
+            fresh = outbox_message(uid, msg, kind="closed")
+            if d:
+                msgs.append(outbox_edit(
+                    uid, d["kb_message_id"], msg, caption=d["kb_caption"], fallback=fresh, kind="closed",
+                ))
+            elif uid in participants:
+                msgs.append(fresh)
+
+        op_id = m.get("operator_id") or m.get("created_by")
+        if op_id:
+            msgs.append(outbox_message(
+                op_id, msg + f"\n📨 В черзі на доставку: <b>{len(participants)}</b>", kind="closed",
+            ))
+        return msgs
+
+    # статус + сповіщення учасникам/оператору — одна транзакція, доставляє OutboxWorker
+    m = await mv_repo.close_move(move_id, notify=notify)
     if not m:
         await cb.answer("Не знайдено.", show_alert=True)
         return
 
-    mv_repo.set_status(move_id, "done")
-    m = mv_repo.get_move(move_id) or m
-
-    msg = (
-        "✅ <b>Переміщення закрито оператором</b>\n"
-        f"🆔 ID: <b>{move_id}</b>\n\n"
-        f"📤 Відправник: <b>{m.get('from_point_name') or '—'}</b>\n"
-        f"📥 Отримувач: <b>{m.get('to_point_name') or '—'}</b>\n"
-    )
-
-    participants = _participants_ids(m)
-    delivered = 0
-    for uid in participants:
-        try:
-            await cb.bot.send_message(uid, msg, parse_mode=PM)
-            delivered += 1
-        except Exception:
-            pass
-
-    op_id = m.get("operator_id") or m.get("created_by")
-    if op_id:
-        try:
-            await cb.bot.send_message(op_id, msg + f"\n📨 Доставлено: <b>{delivered}</b>", parse_mode=PM)
-        except Exception:
-            pass
-
+    outbox.wake()
     await cb.answer("Closed ✅", show_alert=True)
-    await mva_active(cb)
+    # callback вже відповіли алертом — список тільки перемальовуємо
+    await _show_list(cb, "active", moves_page_size, answer=False)
 
 
 # -------------------------------------------------------------------
@@ -284,12 +274,12 @@ async def mva_close(cb: CallbackQuery):
 @router.callback_query(F.data.regexp(r"^mva:reinvoice_\d+$"))
 async def mva_reinvoice_start(cb: CallbackQuery, state: FSMContext):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         return await cb.answer("Не знайдено.", show_alert=True)
 
     await state.clear()
-    await state.update_data(move_id=move_id, photos=[], media_groups_seen=[])
+    await state.update_data(move_id=move_id, photos=[])
     await state.set_state(ReinvoiceStates.waiting_photos)
 
     text = (
@@ -308,7 +298,7 @@ async def mva_reinvoice_cancel(cb: CallbackQuery, state: FSMContext):
     move_id = int(data.get("move_id") or cb.data.split("_")[-1])
     await state.clear()
 
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if m:
         back_cb = "mva:active" if (m.get("status") not in ("done", "canceled")) else "mva:closed"
         await cb.message.answer("❌ Ок, реінвойс скасовано.", parse_mode=PM)
@@ -321,38 +311,33 @@ async def mva_reinvoice_cancel(cb: CallbackQuery, state: FSMContext):
 
 
 @router.message(ReinvoiceStates.waiting_photos)
-async def mva_reinvoice_collect(message: Message, state: FSMContext):
-    file_id = _extract_photo_file_id(message)
-    if not file_id:
+async def mva_reinvoice_collect(message: Message, state: FSMContext, album: list[Message] | None = None):
+    # album — всі частини media group одним викликом (AlbumMiddleware)
+    file_ids = [fid for fid in map(_extract_photo_file_id, album or [message]) if fid]
+    if not file_ids:
         return await message.answer("⚠️ Надішли саме фото/картинку. Потім натисни ✅ <b>Готово</b>.", parse_mode=PM)
 
     data = await state.get_data()
     photos: list[str] = data.get("photos", [])
-    media_groups_seen: list[str] = data.get("media_groups_seen", [])
 
-    if file_id not in photos:
-        photos.append(file_id)
+    for file_id in file_ids:
+        if file_id not in photos:
+            photos.append(file_id)
 
     if len(photos) > MAX_PHOTOS:
         photos = photos[:MAX_PHOTOS]
-        await state.update_data(photos=photos, media_groups_seen=media_groups_seen)
+        await state.update_data(photos=photos)
         return await message.answer(f"⚠️ Ліміт {MAX_PHOTOS} фото. Натисни ✅ <b>Готово</b>.", parse_mode=PM)
 
-    if message.media_group_id:
-        mg = str(message.media_group_id)
-        if mg not in media_groups_seen:
-            media_groups_seen.append(mg)
-            await state.update_data(photos=photos, media_groups_seen=media_groups_seen)
-            return await message.answer(
-                f"📎 Альбом прийнято ✅\nФото в накладній: <b>{len(photos)}</b>\n"
-                "Можеш додати ще або натиснути ✅ <b>Готово</b>.",
-                parse_mode=PM,
-            )
-
-        await state.update_data(photos=photos, media_groups_seen=media_groups_seen)
-        return
+    await state.update_data(photos=photos)
+
+    if album:
+        return await message.answer(
+            f"📎 Альбом прийнято ✅\nФото в накладній: <b>{len(photos)}</b>\n"
+            "Можеш додати ще або натиснути ✅ <b>Готово</b>.",
+            parse_mode=PM,
+        )
 
-    await state.update_data(photos=photos, media_groups_seen=media_groups_seen)
     await message.answer(
         f"✅ Додано фото: <b>{len(photos)}</b>\nМожеш додати ще або натисни ✅ <b>Готово</b>.",
         parse_mode=PM,
@@ -360,7 +345,7 @@ async def mva_reinvoice_collect(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("mva:reinvoice_done_"))
-async def mva_reinvoice_done(cb: CallbackQuery, state: FSMContext):
+async def mva_reinvoice_done(cb: CallbackQuery, state: FSMContext, fanout: Fanout, outbox: OutboxWorker):
     data = await state.get_data()
     move_id = int(data.get("move_id") or cb.data.split("_")[-1])
     photos: list[str] = data.get("photos", [])
@@ -368,47 +353,58 @@ async def mva_reinvoice_done(cb: CallbackQuery, state: FSMContext):
     if not photos:
         return await cb.answer("Спочатку додай хоча б 1 фото.", show_alert=True)
 
-    m = mv_repo.get_move(move_id)
-    if not m:
+    def notify(m: dict) -> list[dict]:
+        # старі пакети: прибираємо кнопки "Віддав/Отримав" — актуальна буде нова накладна
+        text = f"♻️ Накладну оновлено до <b>V{m.get('invoice_version')}</b> — актуальна нижче."
+        return [
+            outbox_edit(d["telegram_id"], d["kb_message_id"], text, caption=d["kb_caption"], kind="stale")
+            for d in m["deliveries"] if d.get("kb_message_id")
+        ]
+
+    # ✅ V+1, фото, історія, скидання статусу і зняття старих кнопок — одна транзакція (PDF не чіпаємо)
+    res = await mv_repo.reinvoice(move_id, photos, notify=notify)
+    if not res:
         await state.clear()
         return await cb.answer("Не знайдено.", show_alert=True)
 
-    mv_repo.bump_invoice_version(move_id)
-    v = mv_repo.get_invoice_version(move_id)
-
-    mv_repo.add_invoice_photos(move_id, v, photos)
-    mv_repo.set_photo(move_id, photos[0])
+    m2 = res["move"]
+    v = res["version"]
 
-    # ✅ PDF не чіпаємо — він незалежний
-    mv_repo.reset_for_reinvoice(move_id)
-
-    m2 = mv_repo.get_move(move_id) or m
-
-    from_pid = m2.get("from_point_id")
-    to_pid = m2.get("to_point_id")
-    if not from_pid or not to_pid:
+    if not m2.get("from_point_id") or not m2.get("to_point_id"):
         await state.clear()
         return await cb.answer("Немає маршруту (from/to).", show_alert=True)
 
-    from_users = auth_repo.get_point_users(int(from_pid))
-    to_users = auth_repo.get_point_users(int(to_pid))
-    from_rec = [u["telegram_id"] for u in from_users if u.get("telegram_id")]
-    to_rec = [u["telegram_id"] for u in to_users if u.get("telegram_id")]
+    from_rec = res["from_rec"]
+    to_rec = res["to_rec"]
 
     caption = f"📣 <b>ОНОВЛЕНА накладна</b> • Переміщення <b>#{move_id}</b> (V{v})\n\n" + move_text(m2)
 
-    sent_from = 0
-    sent_to = 0
-
-    for uid in from_rec:
-        ok = await _send_album_or_single_to_tt(cb.bot, uid, photos, caption, point_from_kb(move_id))
-        if ok:
-            sent_from += 1
+    if len(photos) == 1:
+        # одне фото з кнопками — і так один виклик на людину
+        results = await fanout.run(cb.bot, [
+            Delivery(uid, _tt_album_steps(photos, caption, point_from_kb(move_id)), tag="from") for uid in from_rec
+        ] + [
+            Delivery(uid, _tt_album_steps(photos, caption, point_to_kb(move_id)), tag="to") for uid in to_rec
+        ])
+    else:
+        # альбом один для всіх (copy_messages), кнопки — свої
+        kb_text = "✅ Підтверди дію кнопками нижче:"
+        results = await fanout.run_package(cb.bot, [album_step(photos, caption=caption)], [
+            Delivery(uid, [text_step(kb_text, reply_markup=point_from_kb(move_id))], tag="from") for uid in from_rec
+        ] + [
+            Delivery(uid, [text_step(kb_text, reply_markup=point_to_kb(move_id))], tag="to") for uid in to_rec
+        ], staging_chat_id=cb.from_user.id)
+    sent_from = count_ok(results, "from")
+    sent_to = count_ok(results, "to")
 
-    for uid in to_rec:
-        ok = await _send_album_or_single_to_tt(cb.bot, uid, photos, caption, point_to_kb(move_id))
-        if ok:
-            sent_to += 1
+    try:
+        await mv_repo.record_deliveries(move_id, v, [
+            {"telegram_id": r.chat_id, "role": r.tag, "message_ids": r.message_ids, "kb_caption": len(photos) == 1}
+            for r in results if r.ok
+        ])
+    except Exception:
+        log.exception("record_deliveries failed for move_id=%s", move_id)
+    outbox.wake()
 
     await state.clear()
 
@@ -7,16 +7,17 @@ from aiogram.types import (
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from ..db import auth_repo
-from ..db import moves_repo as mv_repo
+from ..db.aio import auth_repo
+from ..db.aio import moves_repo as mv_repo
 from ..states.point_correction import PointCorrectionStates
+from ..services.outbox import OutboxWorker, DigestPolicy, outbox_message
 
 router = Router()
 PM = "HTML"
 
 
-def _my_point_id(user_id: int) -> int | None:
-    return auth_repo.get_user_point_id(user_id)
+async def _my_point_id(user_id: int) -> int | None:
+    return await auth_repo.get_user_point_id(user_id)
 
 
 def _point_label(m: dict, side: str) -> str:
@@ -87,103 +88,90 @@ def _admin_msg_correction(m: dict, point_name: str, user_id: int, note: str) ->
     )
 
 
-@router.callback_query(F.data.startswith("pt:handed_"))
-async def pt_handed(cb: CallbackQuery):
-    move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
-    if not m:
-        return await cb.answer("❌ Переміщення не знайдено", show_alert=True)
+def _confirm_notify(side: str, confirmer_id: int, digest: DigestPolicy):
+    """
+    notify для mv_repo.confirm: оператору — хто підтвердив (+ закриття, якщо друга сторона вже є).
+    Якщо в оператора є вікно зведення — події підуть одним повідомленням.
+    """
+    admin_msg = _admin_msg_handed if side == "handed" else _admin_msg_received
 
-    # підтвердження тільки коли реально відправлено оператором
-    if (m.get("status") or "").lower() != "sent":
-        return await cb.answer("⚠️ Ще не відправлено оператором", show_alert=True)
+    def notify(m: dict) -> list[dict]:
+        op_id = m.get("operator_id") or m.get("created_by")
+        if not op_id:
+            return []
+        window = digest.window(op_id)
+        msgs = [outbox_message(op_id, admin_msg(m, confirmer_id), kind=side, digest_window=window)]
+        if m.get("status") == "done":
+            msgs.append(outbox_message(op_id, _admin_msg_closed(m), kind="closed", digest_window=window))
+        return msgs
 
-    my_point = _my_point_id(cb.from_user.id)
-    if not my_point:
-        return await cb.answer("❗ Ти не прив’язаний до ТТ", show_alert=True)
+    return notify
 
-    if int(my_point) != int(m.get("from_point_id") or 0):
-        return await cb.answer("⛔ Це не твоє переміщення (ти не відправник)", show_alert=True)
 
-    ok = mv_repo.mark_handed(move_id, cb.from_user.id)
-    if not ok:
-        return await cb.answer("⚠️ Ви вже підтвердили", show_alert=True)
+# результат mv_repo.confirm -> алерт (not_owner залежить від сторони)
+_CONFIRM_ERRORS = {
+    "not_found": "❌ Переміщення не знайдено",
+    "not_sent": "⚠️ Ще не відправлено оператором",
+    "not_linked": "❗ Ти не прив’язаний до ТТ",
+    "already": "⚠️ Ви вже підтвердили",
+}
 
-    await _safe_edit_reply_markup(cb, _kb_only_correction(move_id))
 
-    m = mv_repo.get_move(move_id) or m
-    op_id = m.get("operator_id") or m.get("created_by")
+@router.callback_query(F.data.startswith("pt:handed_"))
+async def pt_handed(cb: CallbackQuery, outbox: OutboxWorker, digest: DigestPolicy):
+    move_id = int(cb.data.split("_")[-1])
 
-    if op_id:
-        try:
-            await cb.bot.send_message(op_id, _admin_msg_handed(m, cb.from_user.id), parse_mode=PM)
-        except Exception:
-            pass
+    # статус, ТТ, підтвердження, закриття і сповіщення оператору — одна транзакція
+    # ТТ юзера — з кешу membership; непривʼязаним відмовляємо без походу в БД
+    my_point = await _my_point_id(cb.from_user.id)
+    if not my_point:
+        return await cb.answer(_CONFIRM_ERRORS["not_linked"], show_alert=True)
 
-    if m.get("received_at"):
-        mv_repo.set_status(move_id, "done")
-        m2 = mv_repo.get_move(move_id)
-        if op_id and m2:
-            try:
-                await cb.bot.send_message(op_id, _admin_msg_closed(m2), parse_mode=PM)
-            except Exception:
-                pass
+    result, m = await mv_repo.confirm(
+        move_id, cb.from_user.id, "handed",
+        notify=_confirm_notify("handed", cb.from_user.id, digest), point_id=my_point,
+    )
+    if result == "not_owner":
+        return await cb.answer("⛔ Це не твоє переміщення (ти не відправник)", show_alert=True)
+    if result != "ok":
+        return await cb.answer(_CONFIRM_ERRORS[result], show_alert=True)
 
+    outbox.wake()
+    await _safe_edit_reply_markup(cb, _kb_only_correction(move_id))
     await cb.answer("✅ Зафіксовано: Віддав", show_alert=True)
 
 
 @router.callback_query(F.data.startswith("pt:received_"))
-async def pt_received(cb: CallbackQuery):
+async def pt_received(cb: CallbackQuery, outbox: OutboxWorker, digest: DigestPolicy):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
-    if not m:
-        return await cb.answer("❌ Переміщення не знайдено", show_alert=True)
-
-    if (m.get("status") or "").lower() != "sent":
-        return await cb.answer("⚠️ Ще не відправлено оператором", show_alert=True)
 
-    my_point = _my_point_id(cb.from_user.id)
+    # ТТ юзера — з кешу membership; непривʼязаним відмовляємо без походу в БД
+    my_point = await _my_point_id(cb.from_user.id)
     if not my_point:
-        return await cb.answer("❗ Ти не прив’язаний до ТТ", show_alert=True)
+        return await cb.answer(_CONFIRM_ERRORS["not_linked"], show_alert=True)
 
-    if int(my_point) != int(m.get("to_point_id") or 0):
+    result, m = await mv_repo.confirm(
+        move_id, cb.from_user.id, "received",
+        notify=_confirm_notify("received", cb.from_user.id, digest), point_id=my_point,
+    )
+    if result == "not_owner":
         return await cb.answer("⛔ Це не твоє переміщення (ти не отримувач)", show_alert=True)
+    if result != "ok":
+        return await cb.answer(_CONFIRM_ERRORS[result], show_alert=True)
 
-    ok = mv_repo.mark_received(move_id, cb.from_user.id)
-    if not ok:
-        return await cb.answer("⚠️ Ви вже підтвердили", show_alert=True)
-
+    outbox.wake()
     await _safe_edit_reply_markup(cb, _kb_only_correction(move_id))
-
-    m = mv_repo.get_move(move_id) or m
-    op_id = m.get("operator_id") or m.get("created_by")
-
-    if op_id:
-        try:
-            await cb.bot.send_message(op_id, _admin_msg_received(m, cb.from_user.id), parse_mode=PM)
-        except Exception:
-            pass
-
-    if m.get("handed_at"):
-        mv_repo.set_status(move_id, "done")
-        m2 = mv_repo.get_move(move_id)
-        if op_id and m2:
-            try:
-                await cb.bot.send_message(op_id, _admin_msg_closed(m2), parse_mode=PM)
-            except Exception:
-                pass
-
     await cb.answer("✅ Зафіксовано: Отримав", show_alert=True)
 
 
 @router.callback_query(F.data.startswith("pt:corr_"))
 async def pt_corr_start(cb: CallbackQuery, state: FSMContext):
     move_id = int(cb.data.split("_")[-1])
-    m = mv_repo.get_move(move_id)
+    m = await mv_repo.get_move(move_id)
     if not m:
         return await cb.answer("❌ Переміщення не знайдено", show_alert=True)
 
-    my_point = _my_point_id(cb.from_user.id)
+    my_point = await _my_point_id(cb.from_user.id)
     if not my_point:
         return await cb.answer("❗ Ти не прив’язаний до ТТ", show_alert=True)
 
@@ -213,7 +201,7 @@ async def pt_corr_note(message: Message, state: FSMContext):
 
 
 @router.message(PointCorrectionStates.waiting_photo)
-async def pt_corr_photo(message: Message, state: FSMContext):
+async def pt_corr_photo(message: Message, state: FSMContext, outbox: OutboxWorker):
     data = await state.get_data()
     move_id = int(data["move_id"])
     note = data.get("note", "")
@@ -229,35 +217,30 @@ async def pt_corr_photo(message: Message, state: FSMContext):
     else:
         return await message.answer("Надішли фото або '-'.", parse_mode=PM)
 
-    mv_repo.request_correction(move_id, message.from_user.id, note, file_id)
-
-    m = mv_repo.get_move(move_id)
-    if not m:
-        await state.clear()
-        return await message.answer("❌ Переміщення не знайдено.", parse_mode=PM)
-
-    op_id = m.get("operator_id") or m.get("created_by")
-
-    point_name = "—"
-    if point_id == int(m.get("from_point_id") or 0):
-        point_name = _point_label(m, "from")
-    elif point_id == int(m.get("to_point_id") or 0):
-        point_name = _point_label(m, "to")
+    user_id = message.from_user.id
 
-    text = _admin_msg_correction(m, point_name, message.from_user.id, note)
+    def notify(m: dict) -> list[dict]:
+        op_id = m.get("operator_id") or m.get("created_by")
+        if not op_id:
+            return []
 
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="↪️ Надіслати нову накладну", callback_data=f"mva:reinvoice_{move_id}")]
-    ])
+        point_name = "—"
+        if point_id == int(m.get("from_point_id") or 0):
+            point_name = _point_label(m, "from")
+        elif point_id == int(m.get("to_point_id") or 0):
+            point_name = _point_label(m, "to")
 
-    if op_id:
-        try:
-            if file_id:
-                await message.bot.send_photo(op_id, photo=file_id, caption=text, reply_markup=kb, parse_mode=PM)
-            else:
-                await message.bot.send_message(op_id, text, reply_markup=kb, parse_mode=PM)
-        except Exception:
-            pass
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="↪️ Надіслати нову накладну", callback_data=f"mva:reinvoice_{move_id}")]
+        ])
+        text = _admin_msg_correction(m, point_name, user_id, note)
+        # коригування — не чекає вікна зведення, а накопичене зведення йде перед ним
+        return [outbox_message(op_id, text, reply_markup=kb, photo=file_id, kind="correction", flush_digest=True)]
 
+    m = await mv_repo.request_correction(move_id, user_id, note, file_id, notify=notify)
     await state.clear()
+    if not m:
+        return await message.answer("❌ Переміщення не знайдено.", parse_mode=PM)
+
+    outbox.wake()
     await message.answer("✅ Коригування відправлено оператору. Очікуй оновлену накладну.", parse_mode=PM)
@@ -1,8 +1,8 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
-from ..db import locations_repo as loc_repo
-from ..db import auth_repo
+from ..db.aio import locations_repo as loc_repo
+from ..db.aio import auth_repo
 from ..keyboards.locations import cities_kb, points_kb
 from ..keyboards.point_users import point_users_list_kb, confirm_kick_kb
 
@@ -11,7 +11,7 @@ router = Router()
 # Меню перегляду користувачів по ТТ: city -> point -> list users
 @router.callback_query(F.data == "pu:choose_city")
 async def choose_city(cb: CallbackQuery):
-    cities = loc_repo.list_cities()
+    cities = await loc_repo.list_cities()
     if not cities:
         await cb.answer("Нема міст.", show_alert=True)
         return
@@ -21,7 +21,7 @@ async def choose_city(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("pu:city_"))
 async def choose_point(cb: CallbackQuery):
     city_id = int(cb.data.split("_")[-1])
-    points = loc_repo.list_points(city_id)
+    points = await loc_repo.list_points(city_id)
     if not points:
         await cb.answer("Нема ТТ.", show_alert=True)
         return
@@ -31,7 +31,7 @@ async def choose_point(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("pu:view_"))
 async def view_point_users(cb: CallbackQuery):
     point_id = int(cb.data.split("_")[-1])
-    users = auth_repo.get_point_users(point_id)
+    users = await auth_repo.get_point_users(point_id)
 
     if not users:
         await cb.message.edit_text("До цієї ТТ ще нікого не прив’язано.", reply_markup=None)
@@ -66,11 +66,11 @@ async def kick_do(cb: CallbackQuery):
     point_id = int(point_id_str)
     user_id = int(user_id_str)
 
-    ok = auth_repo.unlink_user(user_id)
+    ok = await auth_repo.unlink_user(user_id)
     await cb.answer("✅ Прибрано" if ok else "⚠️ Не знайдено", show_alert=True)
 
     # повертаємось до списку
-    users = auth_repo.get_point_users(point_id)
+    users = await auth_repo.get_point_users(point_id)
     if not users:
         await cb.message.edit_text("До цієї ТТ нікого не прив’язано.")
         return
@@ -1,5 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from ..utils.text import attachments_badge
+
 
 def moves_menu_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -104,19 +106,40 @@ def admin_moves_tabs_kb(active: bool = True) -> InlineKeyboardMarkup:
     ])
 
 
-def admin_moves_list_kb(moves: list[dict], back_cb: str) -> InlineKeyboardMarkup:
+def page_nav_row(prefix: str, page: dict) -> list[InlineKeyboardButton]:
+    """◀️/▶️ для сторінки з moves_repo.list_moves_page: callback "<prefix>:p|n:<курсор>"."""
+    row = []
+    if page.get("prev_cursor"):
+        row.append(InlineKeyboardButton(text="◀️ Новіші", callback_data=f"{prefix}:p:{page['prev_cursor']}"))
+    if page.get("next_cursor"):
+        row.append(InlineKeyboardButton(text="Старіші ▶️", callback_data=f"{prefix}:n:{page['next_cursor']}"))
+    return row
+
+
+def moves_list_kb(page: dict) -> InlineKeyboardMarkup:
+    nav = page_nav_row("mv:list", page)
+    return InlineKeyboardMarkup(inline_keyboard=([nav] if nav else []) + moves_menu_kb().inline_keyboard)
+
+
+def admin_moves_list_kb(
+    moves: list[dict], back_cb: str, page: dict | None = None, page_cb: str | None = None,
+) -> InlineKeyboardMarkup:
     rows = []
     for m in moves:
         mid = m["id"]
         fp = m.get("from_point_name") or "—"
         tp = m.get("to_point_name") or "—"
         status = m.get("status") or "?"
+        badge = attachments_badge(m)
         rows.append([
             InlineKeyboardButton(
-                text=f"#{mid} [{status}] {fp} → {tp}"[:60],
+                text=(f"#{mid} [{status}] {fp} → {tp}"[:60 - len(badge)] + badge),
                 callback_data=f"mva:view_{mid}"
             )
         ])
+    nav = page_nav_row(page_cb, page) if page and page_cb else []
+    if nav:
+        rows.append(nav)
     rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=back_cb)])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
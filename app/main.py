@@ -5,14 +5,19 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.fsm.storage.base import BaseStorage
 
 from aiogram.types import BotCommand
 from aiogram.methods import SetMyCommands
 from aiogram.types import BotCommandScopeDefault, BotCommandScopeChat
 
 from .logger import setup_logging
-from .config import load_config
-from .db.pg_schema import ensure_schema
+from .config import Config, load_config
+from .db.pg_schema import migrate
+from .db.pg import close_pool
+from .db.directory import directory
+from .db.invalidation import CacheListener
+from .db.aio import executor as db_executor
 
 from .handlers.start import router as start_router
 from .handlers.locations import router as locations_router
@@ -24,6 +29,17 @@ from .handlers.point_moves import router as point_moves_router
 from .handlers.moves_admin import router as moves_admin_router
 
 from .middlewares.admin_only import AdminOnlyMiddleware
+from .middlewares.album import AlbumMiddleware
+from .middlewares.chat_order import ChatOrderingMiddleware
+from .middlewares.throttling import ThrottlingRequestMiddleware
+from .fsm.memory_storage import BoundedMemoryStorage
+from .fsm.pg_storage import PgStorage, CACHE_TTL as PG_FSM_CACHE_TTL
+from .services.fanout import Fanout
+from .services.metrics import MetricsReporter
+from .services.outbox import OutboxWorker, DigestPolicy
+from .utils.ratelimit import RateLimiter, GLOBAL_RATE
+from .webhook import run_webhook
+from .sharding import run_sharded
 
 
 async def _setup_bot_commands(bot: Bot, admins: set[int]) -> None:
@@ -57,21 +73,70 @@ async def _setup_bot_commands(bot: Bot, admins: set[int]) -> None:
         ))
 
 
-async def main() -> None:
-    setup_logging()
-    log = logging.getLogger("main")
-
-    cfg = load_config()
-
-    # ✅ Postgres schema init
-    ensure_schema()
-
+def create_bot(cfg: Config, global_rate: float = GLOBAL_RATE) -> Bot:
+    """global_rate — частка глобального ліміту Telegram для цього процесу (шардування ділить його між воркерами)."""
     bot = Bot(
         token=cfg.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    # ✅ всі вихідні запити: ліміти Telegram (global + per-chat) і авто-ретрай RetryAfter
+    bot.session.middleware(ThrottlingRequestMiddleware(RateLimiter(global_rate=global_rate)))
+    return bot
+
+
+def create_storage(cfg: Config) -> BaseStorage:
+    if cfg.fsm_storage == "pg":
+        # кеш читань — тільки коли чат закріплений за процесом (шардування), інакше read-through
+        return PgStorage(ttl=cfg.fsm_ttl, cache_ttl=PG_FSM_CACHE_TTL if cfg.workers > 1 else 0.0)
+    return BoundedMemoryStorage(
+        max_entries=cfg.fsm_max_entries,
+        ttl=cfg.fsm_ttl,
+        state_ttls=cfg.fsm_state_ttls,
+    )
 
-    dp = Dispatcher()
+
+def build_dispatcher(cfg: Config, bot: Bot) -> Dispatcher:
+    """Dispatcher з усіма роутерами/middleware і фоновими сервісами (однаковий для polling і webhook)."""
+    log = logging.getLogger("main")
+    dp = Dispatcher(storage=create_storage(cfg))
+    log.info("FSM storage: %s", type(dp.storage).__name__)
+
+    # ✅ метрики черг/очікувань — періодичним рядком у лог (METRICS_INTERVAL)
+    metrics = MetricsReporter(cfg.metrics_interval)
+    dp["metrics"] = metrics
+
+    # middleware лімітів Telegram живе в сесії бота (create_bot) — тримаємо посилання на нього
+    throttling = next((m for m in bot.session.middleware if isinstance(m, ThrottlingRequestMiddleware)), None)
+    if throttling is not None:
+        dp["throttling"] = throttling
+        metrics.add("throttling", throttling.stats)
+
+    # ✅ різні чати — паралельно, один чат — строго по черзі (FSM / збір фото без гонок)
+    chat_order = ChatOrderingMiddleware(concurrency=cfg.update_concurrency)
+    dp.update.outer_middleware(chat_order)
+    dp["chat_order"] = chat_order
+    metrics.add("chat_order", chat_order.stats)
+    # виклики БД: черга на потік/зʼєднання і час запитів (db.aio)
+    metrics.add("db", db_executor.summary)
+
+    # ✅ спільний движок розсилок: доступний у хендлерах як параметр `fanout`
+    fanout = Fanout(
+        concurrency=cfg.fanout_concurrency,
+        mode=cfg.delivery_mode,
+        staging_chat_id=cfg.delivery_staging_chat_id,
+    )
+    dp["fanout"] = fanout
+
+    # ✅ сповіщення з outbox (пишуться в транзакції зі зміною стану) шле фоновий воркер
+    outbox = OutboxWorker(bot, fanout)
+    dp["outbox"] = outbox
+    # вікно зведення сповіщень оператору (DIGEST_WINDOW / DIGEST_WINDOWS="chat_id:сек")
+    dp["digest"] = DigestPolicy(cfg.digest_windows, cfg.digest_window)
+    # розмір сторінки списків переміщень (параметр `moves_page_size` у хендлерах)
+    dp["moves_page_size"] = cfg.moves_page_size
+
+    # ✅ кеші довідника/прив’язок скидаються по NOTIFY з БД (зміни з інших інстансів)
+    cache_listener = CacheListener() if cfg.cache_listen else None
 
     # ✅ ПУБЛІЧНІ РОУТЕРИ (для всіх)
     dp.include_router(start_router)
@@ -92,23 +157,98 @@ async def main() -> None:
     moves_admin_router.message.middleware(AdminOnlyMiddleware(cfg.admins_set))
     moves_admin_router.callback_query.middleware(AdminOnlyMiddleware(cfg.admins_set))
 
+    # ✅ альбом фото накладної -> один виклик хендлера (збір фото)
+    moves_router.message.middleware(AlbumMiddleware())
+    moves_admin_router.message.middleware(AlbumMiddleware())
+
     dp.include_router(locations_router)
     dp.include_router(moves_router)
     dp.include_router(point_users_router)
     dp.include_router(moves_admin_router)
 
-    me = await bot.get_me()
-    log.info("Bot started as @%s", me.username)
+    async def on_startup(bot: Bot) -> None:
+        try:
+            me = await bot.get_me()
+            log.info("Bot started as @%s", me.username)
+        except Exception:
+            log.exception("get_me failed")
+
+        # ✅ Commands меню: продавці бачать тільки /start, адміни — всі
+        try:
+            await _setup_bot_commands(bot, cfg.admins_set)
+            log.info("Bot commands set: default=/start, admins=full")
+        except Exception:
+            log.exception("Failed to set bot commands")
+
+        outbox.start()
+        if cache_listener is not None:
+            cache_listener.start()
+        metrics.start()
+
+    async def on_shutdown() -> None:
+        await metrics.stop()
+        await outbox.stop()
+        if cache_listener is not None:
+            await cache_listener.stop()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+def used_update_types() -> list[str]:
+    """allowed_updates для supervisor-а: тільки роутери, без бота/storage/фонових сервісів."""
+    dp = Dispatcher()
+    dp.include_routers(
+        start_router, auth_router, point_profile_router, point_moves_router,
+        locations_router, moves_router, point_users_router, moves_admin_router,
+    )
+    return dp.resolve_used_update_types()
 
-    # ✅ Commands меню: продавці бачать тільки /start, адміни — всі
-    try:
-        await _setup_bot_commands(bot, cfg.admins_set)
-        log.info("Bot commands set: default=/start, admins=full")
-    except Exception:
-        log.exception("Failed to set bot commands")
 
+async def run_polling(bot: Bot, dp: Dispatcher) -> None:
+    # getUpdates не працює, поки стоїть webhook (напр. після запуску в режимі webhook)
+    await bot.delete_webhook(drop_pending_updates=False)
     await dp.start_polling(bot)
 
 
+async def main() -> None:
+    setup_logging()
+    log = logging.getLogger("main")
+
+    cfg = load_config()
+
+    # ✅ Postgres schema: накатуємо міграції один раз на старті
+    schema_version = migrate()
+    log.info("DB schema at version %s", schema_version)
+
+    if cfg.workers > 1:
+        # supervisor: тільки приймає апдейти і розкладає по воркерах (кожен — свій
+        # build_dispatcher); БД йому більше не потрібна — зʼєднання лишаються воркерам
+        close_pool()
+        try:
+            await run_sharded(cfg, used_update_types())
+        finally:
+            db_executor.shutdown()
+        return
+
+    # довідник міст/ТТ — одразу в памʼять
+    directory.reload()
+
+    bot = create_bot(cfg)
+    dp = build_dispatcher(cfg, bot)
+
+    try:
+        if cfg.run_mode == "webhook":
+            await run_webhook(cfg, bot, dp)
+        else:
+            await run_polling(bot, dp)
+    finally:
+        await dp.storage.close()
+        await bot.session.close()
+        db_executor.shutdown()
+        close_pool()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Callable, Awaitable, Any
+from aiogram.types import Message
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+# скільки чекаємо наступну частину альбому (Telegram шле їх окремими апдейтами)
+ALBUM_LATENCY = 0.6
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """
+    Альбом (повідомлення з однаковим media_group_id) -> ОДИН виклик хендлера.
+
+    Працює тільки для хендлерів, які мають параметр `album`:
+        async def handler(message: Message, album: list[Message] | None = None)
+
+    Перше повідомлення альбому чекає, поки частини перестануть приходити
+    (debounce ALBUM_LATENCY), і викликає хендлер з data["album"] = всі частини
+    по порядку. Решта частин просто додаються в буфер і хендлер не викликають.
+    """
+
+    def __init__(self, latency: float = ALBUM_LATENCY):
+        self.latency = latency
+        self._albums: dict[tuple[int, str], list[Message]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict], Awaitable[Any]],
+        event: Any,
+        data: dict
+    ) -> Any:
+        if not isinstance(event, Message) or not event.media_group_id:
+            return await handler(event, data)
+
+        handler_obj = data.get("handler")
+        if handler_obj is None or "album" not in getattr(handler_obj, "params", ()):
+            return await handler(event, data)
+
+        key = (event.chat.id, str(event.media_group_id))
+        album = self._albums.get(key)
+        if album is not None:
+            album.append(event)
+            return
+
+        album = self._albums[key] = [event]
+        try:
+            while True:
+                size = len(album)
+                await asyncio.sleep(self.latency)
+                if len(album) == size:
+                    break
+        finally:
+            self._albums.pop(key, None)
+
+        data["album"] = sorted(album, key=lambda m: m.message_id)
+        return await handler(event, data)
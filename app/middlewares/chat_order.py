@@ -0,0 +1,180 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import Update
+
+# скільки апдейтів (з різних чатів) обробляються одночасно
+CONCURRENCY = 64
+
+_OWN = "own"
+_JOIN = "join"
+
+
+class _ChatQueue:
+    __slots__ = ("busy", "inflight", "media_group", "waiters")
+
+    def __init__(self) -> None:
+        self.busy = False
+        self.inflight = 0   # власник черги + частини його альбому, що ще обробляються
+        self.media_group: str | None = None
+        self.waiters: deque[tuple[asyncio.Future, str | None]] = deque()
+
+
+def _chat_id(update: Update) -> int | None:
+    event = update.event
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        message = getattr(event, "message", None)  # callback_query
+        chat = getattr(message, "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else None
+
+
+def _media_group_id(update: Update) -> str | None:
+    message = update.message
+    if message is not None and message.media_group_id:
+        return str(message.media_group_id)
+    return None
+
+
+class ChatOrderingMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: різні чати — паралельно (не більше
+    `concurrency` хендлерів одночасно), апдейти одного чату — строго по черзі
+    (FSM-кроки, збір фото не змагаються між собою).
+
+    Виняток — альбом: поки обробляється частина альбому, решта частин цього ж
+    media_group проходять одразу (інакше AlbumMiddleware не дочекається їх
+    і розріже альбом на шматки). Наступний апдейт чату чекає, поки завершаться
+    ВСІ частини альбому.
+
+    Метрики: stats() — активні чати, черга, lag (скільки апдейт чекав своєї черги);
+    у лог їх періодично пише MetricsReporter.
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY):
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._chats: dict[int, _ChatQueue] = {}
+        # метрики
+        self.running = 0
+        self.queued = 0
+        self.queued_max = 0
+        self.processed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "active_chats": len(self._chats),
+            "running": self.running,
+            "queued": self.queued,
+            "queued_max": self.queued_max,
+            "processed": self.processed,
+            "lag_avg": round(self.lag_total / self.processed, 4) if self.processed else 0.0,
+            "lag_max": round(self.lag_max, 4),
+        }
+
+    # ---------- черга чату ----------
+    async def _acquire(self, chat_id: int, media_group: str | None) -> str:
+        q = self._chats.get(chat_id)
+        if q is None:
+            q = self._chats[chat_id] = _ChatQueue()
+
+        if media_group and q.busy and q.media_group == media_group:
+            q.inflight += 1
+            return _JOIN
+        if not q.busy:
+            self._own(q, media_group)
+            return _OWN
+
+        fut = asyncio.get_running_loop().create_future()
+        q.waiters.append((fut, media_group))
+        self.queued += 1
+        self.queued_max = max(self.queued_max, self.queued)
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._done(chat_id)
+            else:
+                try:
+                    q.waiters.remove((fut, media_group))
+                    self.queued -= 1
+                except ValueError:
+                    pass
+            raise
+
+    def _own(self, q: _ChatQueue, media_group: str | None) -> None:
+        q.busy = True
+        q.inflight = 1
+        q.media_group = media_group
+        if not media_group:
+            return
+        # частини цього ж альбому, що вже стоять у черзі, — пропускаємо
+        rest: deque[tuple[asyncio.Future, str | None]] = deque()
+        for fut, mg in q.waiters:
+            if mg == media_group and not fut.done():
+                self.queued -= 1
+                q.inflight += 1
+                fut.set_result(_JOIN)
+            else:
+                rest.append((fut, mg))
+        q.waiters = rest
+
+    def _done(self, chat_id: int) -> None:
+        q = self._chats.get(chat_id)
+        if q is None:
+            return
+        q.inflight -= 1
+        if q.inflight > 0:
+            return
+        while q.waiters:
+            fut, mg = q.waiters.popleft()
+            if fut.done():
+                continue
+            self.queued -= 1
+            self._own(q, mg)
+            fut.set_result(_OWN)
+            return
+        q.busy = False
+        q.media_group = None
+        del self._chats[chat_id]
+
+    # ---------- middleware ----------
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict], Awaitable[Any]],
+        event: Any,
+        data: dict,
+    ) -> Any:
+        chat_id = _chat_id(event) if isinstance(event, Update) else None
+        if chat_id is None:
+            return await self._run(handler, event, data)
+
+        enqueued = time.monotonic()
+        role = await self._acquire(chat_id, _media_group_id(event))
+        lag = time.monotonic() - enqueued
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+
+        try:
+            if role == _JOIN:
+                # частина альбому лише додається в буфер AlbumMiddleware — без слоту семафора
+                return await handler(event, data)
+            return await self._run(handler, event, data)
+        finally:
+            self._done(chat_id)
+
+    async def _run(self, handler, event, data) -> Any:
+        async with self._sem:
+            self.running += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.running -= 1
+                self.processed += 1
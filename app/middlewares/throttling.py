@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from ..utils.ratelimit import RateLimiter
+
+log = logging.getLogger(__name__)
+
+# методи, які створюють/змінюють повідомлення в чаті — на них діють ліміти Telegram
+LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+MAX_RETRIES = 3
+
+# False — RetryAfter не ретраїмо тут, а одразу віддаємо нагору (outbox: рядок під
+# орендою не повинен спати в middleware, він відкладається власним backoff-ом outbox)
+retry_after_enabled: ContextVar[bool] = ContextVar("retry_after_enabled", default=True)
+
+
+def _messages_count(method: TelegramMethod[Any]) -> int:
+    media = getattr(method, "media", None)
+    if isinstance(media, list):
+        return max(1, len(media))
+    message_ids = getattr(method, "message_ids", None)
+    if isinstance(message_ids, list):
+        return max(1, len(message_ids))
+    return 1
+
+
+class ThrottlingRequestMiddleware(BaseRequestMiddleware):
+    """
+    Request-middleware сесії бота: через нього йде КОЖЕН вихідний запит.
+
+    - send*/copy*/forward*/edit* чекають слот у RateLimiter (глобально ~30/с
+      + per-chat), тож під навантаженням ми самі тримаємось у лімітах
+    - на RetryAfter спимо рівно retry_after від Telegram і повторюємо
+      (до max_retries разів, кожен повтор знову бере слот у RateLimiter),
+      замість того щоб мовчки губити повідомлення
+
+    Підключення: bot.session.middleware(ThrottlingRequestMiddleware(RateLimiter()))
+    Метрики: stats() — черга на ліміт і час очікування; у лог пише MetricsReporter (dp["throttling"]).
+    """
+
+    def __init__(self, limiter: RateLimiter | None = None, max_retries: int = MAX_RETRIES):
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        # метрики
+        self.waiting = 0
+        self.waiting_max = 0
+        self.throttled_seconds = 0.0
+        self.retries = 0
+        self.retry_after_seconds = 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "waiting": self.waiting,
+            "waiting_max": self.waiting_max,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "retries": self.retries,
+            "retry_after_seconds": self.retry_after_seconds,
+        }
+
+    async def _throttle(self, method: TelegramMethod[Any]) -> None:
+        if not method.__api_method__.startswith(LIMITED_PREFIXES):
+            return
+
+        self.waiting += 1
+        self.waiting_max = max(self.waiting_max, self.waiting)
+        try:
+            self.throttled_seconds += await self.limiter.acquire(
+                getattr(method, "chat_id", None),
+                _messages_count(method),
+            )
+        finally:
+            self.waiting -= 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Any,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        await self._throttle(method)
+
+        attempt = 0
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries or not retry_after_enabled.get():
+                    raise
+                attempt += 1
+                self.retries += 1
+                self.retry_after_seconds += e.retry_after
+                log.warning(
+                    "RetryAfter %ss on %s chat=%s (attempt %s/%s, waiting=%s)",
+                    e.retry_after, method.__api_method__, getattr(method, "chat_id", None),
+                    attempt, self.max_retries, self.waiting,
+                )
+                await asyncio.sleep(e.retry_after)
+                # повтор — це новий запит: знову через бакети, інакше сплеск ретраїв обходить ліміти
+                await self._throttle(method)
@@ -0,0 +1,181 @@
+# app/services/fanout.py
+"""
+Розсилка одного й того ж пакета багатьом отримувачам.
+
+- різні чати обробляються паралельно (не більше `concurrency` одночасно)
+- в межах одного чату кроки йдуть строго по черзі: альбом -> PDF -> кнопки
+- ліміти Telegram і RetryAfter обробляє сесія бота (ThrottlingRequestMiddleware)
+- результат — по кожному отримувачу окремо (ok / помилка / message_id-и)
+
+Хендлери формують список Delivery і викликають:
+    results = await fanout.run(bot, deliveries)
+
+Однаковий для всіх пакет (альбом накладної / PDF) — через run_package:
+в режимі "copy" він шлеться ОДИН раз у staging-чат, а отримувачам іде
+copy_messages цих message_id (1 виклик на людину замість альбом + PDF).
+"""
+import asyncio
+import logging
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+
+log = logging.getLogger(__name__)
+
+PM = "HTML"
+CONCURRENCY = 8
+
+DELIVERY_MODES = ("copy", "upload")
+
+
+@dataclass
+class Step:
+    """Один API-виклик для чату."""
+    call: Callable[[Bot, int], Awaitable[Any]]
+
+
+@dataclass
+class Delivery:
+    chat_id: int
+    steps: list[Step]
+    tag: str = ""
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: int
+    tag: str
+    ok: bool
+    message_ids: list[int] = field(default_factory=list)
+    error: str | None = None
+    exc: Exception | None = field(default=None, repr=False)
+
+
+def count_ok(results: list[DeliveryResult], tag: str | None = None) -> int:
+    return sum(1 for r in results if r.ok and (tag is None or r.tag == tag))
+
+
+# ---------- step builders ----------
+def text_step(text: str, reply_markup=None) -> Step:
+    return Step(lambda bot, uid: bot.send_message(uid, text, reply_markup=reply_markup, parse_mode=PM))
+
+
+def photo_step(photo: str, caption: str | None = None, reply_markup=None) -> Step:
+    return Step(lambda bot, uid: bot.send_photo(
+        uid, photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=PM,
+    ))
+
+
+def document_step(document: str, caption: str | None = None) -> Step:
+    return Step(lambda bot, uid: bot.send_document(uid, document=document, caption=caption, parse_mode=PM))
+
+
+def album_step(photos: list[str], caption: str | None = None) -> Step:
+    """1 фото -> send_photo, 2+ -> send_media_group (caption на першому)."""
+    if len(photos) == 1:
+        return photo_step(photos[0], caption=caption)
+
+    def call(bot: Bot, uid: int):
+        media = [InputMediaPhoto(media=fid) for fid in photos]
+        media[0].caption = caption
+        media[0].parse_mode = PM
+        return bot.send_media_group(uid, media=media)
+
+    return Step(call)
+
+
+def copy_step(from_chat_id: int, message_ids: list[int]) -> Step:
+    """Копія вже надісланих повідомлень (альбом лишається альбомом) — один виклик."""
+    return Step(lambda bot, uid: bot.copy_messages(
+        chat_id=uid, from_chat_id=from_chat_id, message_ids=message_ids,
+    ))
+
+
+def _message_ids(sent: Any) -> list[int]:
+    # Message (send_*) або MessageId (copy_messages)
+    if isinstance(sent, (list, tuple)):
+        return [m.message_id for m in sent if hasattr(m, "message_id")]
+    if hasattr(sent, "message_id"):
+        return [sent.message_id]
+    return []
+
+
+class Fanout:
+    def __init__(self, concurrency: int = CONCURRENCY, mode: str = "copy", staging_chat_id: int | None = None):
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self.mode = mode if mode in DELIVERY_MODES else "copy"
+        self.staging_chat_id = staging_chat_id
+
+    async def run(self, bot: Bot, deliveries: Iterable[Delivery]) -> list[DeliveryResult]:
+        # всі доставки в один чат — одна послідовна черга (щоб не змішався порядок)
+        per_chat: dict[int, list[Delivery]] = {}
+        for d in deliveries:
+            per_chat.setdefault(int(d.chat_id), []).append(d)
+
+        chunks = await asyncio.gather(*(self._deliver_chat(bot, ds) for ds in per_chat.values()))
+        return [r for chunk in chunks for r in chunk]
+
+    async def run_package(
+        self,
+        bot: Bot,
+        package: list[Step],
+        deliveries: Iterable[Delivery],
+        staging_chat_id: int | None = None,
+    ) -> list[DeliveryResult]:
+        """
+        Кожен отримувач: package (спільний) + свої d.steps (напр. кнопки).
+
+        mode="copy": package шлемо один раз у staging-чат (DELIVERY_STAGING_CHAT_ID,
+        інакше staging_chat_id — зазвичай оператор), далі кожному copy_messages.
+        Якщо staging не вдався — звичайна доставка пакета кожному.
+        """
+        deliveries = list(deliveries)
+        head = package
+        staging = self.staging_chat_id or staging_chat_id
+
+        if self.mode == "copy" and package and staging and deliveries:
+            staged = await self._deliver(bot, Delivery(staging, package, tag="staging"))
+            if staged.ok and staged.message_ids:
+                head = [copy_step(staging, staged.message_ids)]
+            else:
+                log.warning("FANOUT staging failed chat=%s: %s — fallback to upload", staging, staged.error)
+
+        return await self.run(bot, [Delivery(d.chat_id, head + d.steps, tag=d.tag) for d in deliveries])
+
+    async def _deliver_chat(self, bot: Bot, deliveries: list[Delivery]) -> list[DeliveryResult]:
+        async with self._sem:
+            return [await self._deliver(bot, d) for d in deliveries]
+
+    async def _deliver(self, bot: Bot, d: Delivery) -> DeliveryResult:
+        res = DeliveryResult(chat_id=d.chat_id, tag=d.tag, ok=False)
+        if not d.steps:
+            res.error = "nothing to send"
+            log.warning("FANOUT uid=%s tag=%s: nothing to send", d.chat_id, d.tag)
+            return res
+
+        try:
+            for step in d.steps:
+                res.message_ids += _message_ids(await step.call(bot, d.chat_id))
+            res.ok = True
+        except TelegramRetryAfter as e:
+            res.exc = e
+            res.error = f"flood_wait={getattr(e, 'retry_after', None)}"
+            log.error("FANOUT FAIL uid=%s tag=%s %s", d.chat_id, d.tag, res.error)
+        except TelegramForbiddenError as e:
+            res.exc = e
+            res.error = f"forbidden: {e}"
+            log.error("FANOUT FAIL uid=%s tag=%s %s", d.chat_id, d.tag, res.error)
+        except TelegramBadRequest as e:
+            # тут найчастіше: wrong file_id, chat not found, can't parse entities, etc.
+            res.exc = e
+            res.error = f"bad_request: {e}"
+            log.error("FANOUT FAIL uid=%s tag=%s %s", d.chat_id, d.tag, res.error)
+        except Exception as e:
+            res.exc = e
+            res.error = f"unknown: {e}"
+            log.error("FANOUT FAIL uid=%s tag=%s %s\n%s", d.chat_id, d.tag, res.error, traceback.format_exc())
+        return res
@@ -0,0 +1,69 @@
+# app/services/metrics.py
+"""
+Періодичний звіт метрик у лог: кожні METRICS_INTERVAL секунд (0 — вимкнено)
+по рядку на джерело, напр.
+
+    metrics throttling: {'waiting': 0, 'waiting_max': 12, 'throttled_seconds': 3.4, ...}
+
+Джерело — будь-що зі stats() -> dict (middleware, воркери, кеші):
+
+    reporter.add("throttling", throttling.stats)
+
+Лічильники накопичувальні з моменту старту процесу: різниця між двома
+рядками — навантаження за інтервал.
+"""
+import asyncio
+import logging
+from typing import Any, Callable
+
+log = logging.getLogger(__name__)
+
+INTERVAL = 300.0
+
+StatsFn = Callable[[], dict[str, Any]]
+
+
+class MetricsReporter:
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self._sources: dict[str, StatsFn] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, name: str, stats: StatsFn) -> None:
+        self._sources[name] = stats
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        out: dict[str, dict[str, Any]] = {}
+        for name, stats in self._sources.items():
+            try:
+                out[name] = stats()
+            except Exception:
+                log.exception("Metrics source %s failed", name)
+        return out
+
+    def report(self) -> None:
+        for name, values in self.snapshot().items():
+            log.info("metrics %s: %s", name, values)
+
+    def start(self) -> None:
+        if self.interval <= 0 or not self._sources:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="metrics-reporter")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # останній зріз — щоб у лозі лишились цифри за неповний інтервал
+        if self.interval > 0:
+            self.report()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
@@ -0,0 +1,306 @@
+# app/services/outbox.py
+"""
+Outbox: надійна доставка сповіщень.
+
+Хендлер не шле повідомлення сам — repo пише їх у таблицю outbox в ТІЙ САМІЙ
+транзакції, що й зміну стану (confirm / коригування / закриття). Після commit
+хендлер одразу відповідає юзеру, а OutboxWorker у фоні:
+
+- забирає due-рядки (FOR UPDATE SKIP LOCKED + оренда, тож рестарт посеред
+  відправки не губить повідомлення — воно просто піде ще раз)
+- шле через Fanout (паралельно по чатах, по порядку в межах чату)
+- помилка мережі / RetryAfter -> повтор з експоненційним backoff (RetryAfter не
+  чекаємо в ThrottlingRequestMiddleware: інакше оренда могла б закінчитись
+  посеред сну і інший інстанс відправив би рядок вдруге)
+- Forbidden / BadRequest або MAX_ATTEMPTS спроб -> status='dead' (dead letter)
+- edit, який Telegram не прийняв (повідомлення видалене / застаре) -> якщо є
+  fallback, рядок перетворюється на нове повідомлення і йде одразу
+- digest-рядки одного чату (події Віддав/Отримав/Закрито за вікно DigestPolicy)
+  зводяться в одне повідомлення
+
+Повідомлення для outbox будуються через outbox_message(...) / outbox_edit(...).
+"""
+import asyncio
+import logging
+import random
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from ..db.aio import outbox_repo
+from ..middlewares.throttling import retry_after_enabled
+from .fanout import Fanout, Delivery, DeliveryResult, Step, text_step
+
+log = logging.getLogger(__name__)
+
+PM = "HTML"
+
+BATCH = 20
+POLL_INTERVAL = 2.0
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 600.0
+PURGE_EVERY = 3600.0
+DIGEST_LIMIT = 4000  # запас до ліміту Telegram 4096
+
+# методи Bot, які можна класти в outbox
+ALLOWED_METHODS = ("send_message", "send_photo", "edit_message_text", "edit_message_caption")
+
+
+class DigestPolicy:
+    """
+    Вікно зведення (сек) на оператора: події за вікно приходять одним повідомленням.
+    0 — без зведення, кожна подія окремо. Налаштування: DIGEST_WINDOW / DIGEST_WINDOWS.
+    """
+
+    def __init__(self, windows: dict[int, int] | None = None, default: int = 0):
+        self.windows = dict(windows or {})
+        self.default = default
+
+    def window(self, chat_id: int) -> int:
+        return max(0, self.windows.get(int(chat_id), self.default))
+
+
+def outbox_message(
+    chat_id: int,
+    text: str,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    photo: str | None = None,
+    kind: str | None = None,
+    digest_window: int = 0,
+    flush_digest: bool = False,
+) -> dict:
+    """
+    Рядок для outbox_repo.enqueue_many: текст або фото з caption (+ кнопки).
+    digest_window > 0 (тільки текст без кнопок) — подія йде в зведення чату;
+    flush_digest — перед цим повідомленням віддати накопичене зведення.
+    """
+    payload: dict = {"parse_mode": PM}
+    if photo:
+        method = "send_photo"
+        payload.update(photo=photo, caption=text)
+    else:
+        method = "send_message"
+        payload["text"] = text
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup.model_dump(exclude_none=True)
+    msg = {"chat_id": int(chat_id), "method": method, "payload": payload, "kind": kind}
+    if digest_window > 0 and method == "send_message" and reply_markup is None:
+        msg["digest_window"] = digest_window
+    if flush_digest:
+        msg["flush_digest"] = True
+    return msg
+
+
+def outbox_edit(
+    chat_id: int,
+    message_id: int,
+    text: str,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    caption: bool = False,
+    fallback: dict | None = None,
+    kind: str | None = None,
+) -> dict:
+    """
+    Редагування вже надісланого повідомлення (текст або caption фото).
+    Без reply_markup Telegram прибирає старі кнопки.
+    fallback — outbox_message(...), який піде, якщо редагувати вже не можна.
+    """
+    payload: dict = {"message_id": int(message_id), "parse_mode": PM}
+    if caption:
+        method = "edit_message_caption"
+        payload["caption"] = text
+    else:
+        method = "edit_message_text"
+        payload["text"] = text
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup.model_dump(exclude_none=True)
+    if fallback:
+        payload["_fallback"] = {"method": fallback["method"], "payload": fallback["payload"]}
+    return {"chat_id": int(chat_id), "method": method, "payload": payload, "kind": kind}
+
+
+def _row_step(row: dict) -> Step:
+    method = row["method"]
+    payload = dict(row["payload"])
+    payload.pop("_fallback", None)
+    if "reply_markup" in payload:
+        payload["reply_markup"] = InlineKeyboardMarkup.model_validate(payload["reply_markup"])
+    return Step(lambda bot, uid: getattr(bot, method)(chat_id=uid, **payload))
+
+
+def _digest_steps(rows: list[dict]) -> list[Step]:
+    """Кілька подій одного чату -> одне повідомлення (або кілька, якщо не влазить)."""
+    if len(rows) == 1:
+        return [_row_step(rows[0])]
+
+    chunks: list[str] = []
+    buf = f"🗂 <b>Зведення</b> • подій: <b>{len(rows)}</b>"
+    for row in rows:
+        text = row["payload"].get("text") or ""
+        if len(buf) + len(text) + 2 > DIGEST_LIMIT:
+            chunks.append(buf)
+            buf = text
+        else:
+            buf = f"{buf}\n\n{text}"
+    chunks.append(buf)
+    return [text_step(chunk) for chunk in chunks]
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        bot: Bot,
+        fanout: Fanout,
+        batch: int = BATCH,
+        poll_interval: float = POLL_INTERVAL,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.bot = bot
+        self.fanout = fanout
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._purged_at = time.monotonic()
+        # метрики
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "retried": self.retried, "dead": self.dead}
+
+    def wake(self) -> None:
+        """Хендлер щойно закомітив повідомлення — не чекаємо poll_interval."""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="outbox-worker")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        log.info("Outbox worker started")
+        while True:
+            self._wake.clear()
+            try:
+                claimed = await self.drain_once()
+                await self._maybe_purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Outbox drain failed")
+                claimed = 0
+
+            if claimed >= self.batch:
+                continue  # черга ще не порожня
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain_once(self) -> int:
+        rows = await outbox_repo.claim(self.batch, LEASE_SECONDS)
+        if not rows:
+            return 0
+
+        # tag -> рядки outbox, які закриває ця доставка (digest: кілька рядків на одну)
+        by_tag: dict[str, list[dict]] = {}
+        deliveries: list[Delivery] = []
+        for row in rows:
+            if row["method"] not in ALLOWED_METHODS:
+                await self._dead(row, f"unknown method: {row['method']}")
+                continue
+
+            if row.get("digest") and row["method"] == "send_message":
+                tag = f"digest:{row['chat_id']}"
+                if tag not in by_tag:
+                    by_tag[tag] = []
+                    deliveries.append(Delivery(row["chat_id"], [], tag=tag))
+                by_tag[tag].append(row)
+                continue
+
+            tag = str(row["id"])
+            by_tag[tag] = [row]
+            deliveries.append(Delivery(row["chat_id"], [_row_step(row)], tag=tag))
+
+        for d in deliveries:
+            if d.tag.startswith("digest:"):
+                d.steps = _digest_steps(by_tag[d.tag])
+
+        # таски fanout успадковують контекст — middleware не ретраїть RetryAfter для рядків під орендою
+        token = retry_after_enabled.set(False)
+        try:
+            results = await self.fanout.run(self.bot, deliveries)
+        finally:
+            retry_after_enabled.reset(token)
+        await asyncio.gather(*(self._settle(row, r) for r in results for row in by_tag[r.tag]))
+        return len(rows)
+
+    async def _settle(self, row: dict, res: DeliveryResult) -> None:
+        if res.ok:
+            self.sent += 1
+            await outbox_repo.mark_sent(row["id"])
+            return
+
+        error = res.error or "unknown"
+        if isinstance(res.exc, TelegramBadRequest) and row["method"].startswith("edit_"):
+            if "message is not modified" in str(res.exc):
+                self.sent += 1
+                await outbox_repo.mark_sent(row["id"])
+                return
+            fallback = (row.get("payload") or {}).get("_fallback")
+            if fallback:
+                log.info("OUTBOX id=%s chat=%s: edit failed (%s) -> fallback", row["id"], row["chat_id"], error)
+                await outbox_repo.replace_with_fallback(row["id"], fallback["method"], fallback["payload"], error)
+                self.wake()
+                return
+        if isinstance(res.exc, (TelegramForbiddenError, TelegramBadRequest)):
+            return await self._dead(row, error)
+        flood = isinstance(res.exc, TelegramRetryAfter)
+        # RetryAfter — не збій доставки, а "почекай": у dead letter через нього не кладемо
+        if int(row["attempts"]) >= self.max_attempts and not flood:
+            return await self._dead(row, error)
+
+        delay = _backoff(int(row["attempts"]))
+        if flood:
+            delay = max(float(res.exc.retry_after), 1.0)
+        self.retried += 1
+        log.warning(
+            "OUTBOX RETRY id=%s chat=%s attempt=%s in %.1fs: %s",
+            row["id"], row["chat_id"], row["attempts"], delay, error,
+        )
+        await outbox_repo.mark_retry(row["id"], error, delay)
+
+    async def _dead(self, row: dict, error: str) -> None:
+        self.dead += 1
+        log.error("OUTBOX DEAD id=%s chat=%s kind=%s: %s", row["id"], row["chat_id"], row.get("kind"), error)
+        await outbox_repo.mark_dead(row["id"], error)
+
+    async def _maybe_purge(self) -> None:
+        now = time.monotonic()
+        if now - self._purged_at < PURGE_EVERY:
+            return
+        self._purged_at = now
+        purged = await outbox_repo.purge_sent()
+        if purged:
+            log.info("Outbox: purged %s sent rows", purged)
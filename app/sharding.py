@@ -0,0 +1,240 @@
+# app/sharding.py
+"""
+Кілька процесів (WORKERS > 1): один приймач апдейтів + N воркерів.
+
+- supervisor (головний процес): забирає сирі апдейти (getUpdates або webhook),
+  дістає з JSON chat_id і кладе апдейт у чергу воркера hash(chat_id) % N —
+  всі апдейти одного чату завжди в одному процесі, тож порядок у чаті і
+  кеші FSM/альбомів лишаються коректними
+- worker: той самий build_dispatcher() з main.py (роутери/middleware без змін),
+  апдейти йдуть через dp.feed_raw_update
+- воркер, що впав, перезапускається з тією ж чергою
+- ліміти на весь бот діляться між воркерами: глобальний бюджет Telegram
+  (GLOBAL_RATE / N на процес) і зʼєднання з БД (DB_POOL_MAX // N на процес)
+- черга воркера повна -> supervisor чекає (backpressure), не блокуючи event loop
+"""
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import queue
+import signal
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from .config import Config, load_config
+
+log = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+MONITOR_INTERVAL = 5.0
+QUEUE_SIZE = 10_000
+
+
+def route_chat_id(raw: dict[str, Any]) -> int | None:
+    """chat_id з сирого Update (без парсингу в aiogram-моделі)."""
+    for key, value in raw.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return int(user["id"])
+    return None
+
+
+# ---------------- worker ----------------
+def worker_main(index: int, updates: mp.Queue, workers: int) -> None:
+    from .db.pg import set_pool_share
+    from .logger import setup_logging
+
+    # Ctrl+C ловить supervisor і зупиняє воркерів через чергу (дообробивши взяте)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+    # до імпорту db.aio: розмір пулу/потоків БД рахується від частки процесу
+    set_pool_share(workers)
+    try:
+        asyncio.run(_worker(index, updates, workers))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(index: int, updates: mp.Queue, workers: int) -> None:
+    from .db.aio import executor as db_executor
+    from .db.pg import close_pool
+    from .main import build_dispatcher, create_bot
+    from .utils.ratelimit import GLOBAL_RATE
+
+    cfg = load_config()
+    bot = create_bot(cfg, global_rate=GLOBAL_RATE / workers)
+    dp = build_dispatcher(cfg, bot)
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    log.info("Worker %s started", index)
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, updates.get)
+            if raw is None:
+                break
+            # як handle_as_tasks у polling; порядок у чаті тримає ChatOrderingMiddleware
+            task = asyncio.create_task(dp.feed_raw_update(bot, json.loads(raw)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await dp.storage.close()
+        await bot.session.close()
+        db_executor.shutdown()
+        close_pool()
+        log.info("Worker %s stopped", index)
+
+
+# ---------------- supervisor ----------------
+class Supervisor:
+    def __init__(self, cfg: Config, workers: int):
+        self.cfg = cfg
+        self.n = workers
+        self._ctx = mp.get_context("spawn")
+        self.queues = [self._ctx.Queue(QUEUE_SIZE) for _ in range(workers)]
+        self.procs: list[mp.Process | None] = [None] * workers
+        self.routed = [0] * workers
+        self.backpressure = 0
+
+    def _spawn(self, index: int) -> None:
+        p = self._ctx.Process(
+            target=worker_main, args=(index, self.queues[index], self.n), name=f"bot-worker-{index}",
+        )
+        p.start()
+        self.procs[index] = p
+        log.info("Spawned worker %s pid=%s", index, p.pid)
+
+    async def route(self, raw: dict[str, Any]) -> None:
+        chat_id = route_chat_id(raw)
+        index = hash(chat_id) % self.n if chat_id is not None else 0
+        self.routed[index] += 1
+        data = json.dumps(raw)
+        try:
+            self.queues[index].put_nowait(data)
+        except queue.Full:
+            # воркер не встигає: чекаємо місця в потоці пулу, event loop вільний
+            self.backpressure += 1
+            log.warning("Worker %s queue full, waiting (backpressure=%s)", index, self.backpressure)
+            await asyncio.get_running_loop().run_in_executor(None, self.queues[index].put, data)
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for i, p in enumerate(self.procs):
+                if p is not None and not p.is_alive():
+                    log.error("Worker %s died (exitcode=%s), restarting", i, p.exitcode)
+                    self._spawn(i)
+
+    def stop(self) -> None:
+        for q in self.queues:
+            q.put(None)
+        for i, p in enumerate(self.procs):
+            if p is None:
+                continue
+            p.join(timeout=30)
+            if p.is_alive():
+                log.warning("Worker %s did not stop in time, terminating", i)
+                p.terminate()
+
+    # ---- приймачі ----
+    async def _poll(self, allowed_updates: list[str]) -> None:
+        url = f"https://api.telegram.org/bot{self.cfg.bot_token}"
+        offset = None
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            # getUpdates не працює, поки стоїть webhook (інакше кожен виклик — 409 Conflict);
+            # як і bot.delete_webhook() в одно-процесному режимі — без цього не стартуємо
+            async with session.post(f"{url}/deleteWebhook") as resp:
+                body = await resp.json()
+            if not body.get("ok"):
+                raise RuntimeError(f"deleteWebhook failed ({resp.status}): {body.get('description')}")
+            log.info("Webhook removed, polling getUpdates")
+            while True:
+                params: dict[str, Any] = {"timeout": POLL_TIMEOUT, "allowed_updates": allowed_updates}
+                if offset is not None:
+                    params["offset"] = offset
+                try:
+                    async with session.post(f"{url}/getUpdates", json=params) as resp:
+                        body = await resp.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    log.warning("getUpdates failed: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+
+                if not body.get("ok"):
+                    retry = (body.get("parameters") or {}).get("retry_after") or 1
+                    log.warning("getUpdates error: %s", body.get("description"))
+                    await asyncio.sleep(retry)
+                    continue
+
+                for raw in body.get("result", []):
+                    offset = int(raw["update_id"]) + 1
+                    await self.route(raw)
+
+    async def _webhook(self, allowed_updates: list[str]) -> None:
+        cfg = self.cfg
+
+        async def handle(request: web.Request) -> web.Response:
+            if cfg.webhook_secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != cfg.webhook_secret:
+                return web.Response(status=401, text="Unauthorized")
+            await self.route(await request.json())
+            return web.Response(text="ok")
+
+        async def healthz(request: web.Request) -> web.Response:
+            return web.Response(text="ok")
+
+        app = web.Application()
+        app.router.add_post(cfg.webhook_path, handle)
+        app.router.add_get("/healthz", healthz)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, cfg.webhook_host, cfg.webhook_port).start()
+        log.info("Sharded webhook on http://%s:%s%s", cfg.webhook_host, cfg.webhook_port, cfg.webhook_path)
+        try:
+            if cfg.webhook_url:
+                params: dict[str, Any] = {"url": cfg.webhook_url + cfg.webhook_path, "allowed_updates": allowed_updates}
+                if cfg.webhook_secret:
+                    params["secret_token"] = cfg.webhook_secret
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(f"https://api.telegram.org/bot{cfg.bot_token}/setWebhook", json=params) as resp:
+                        log.info("setWebhook: %s", await resp.text())
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def run(self, allowed_updates: list[str]) -> None:
+        for i in range(self.n):
+            self._spawn(i)
+        monitor = asyncio.create_task(self._monitor())
+        try:
+            if self.cfg.run_mode == "webhook":
+                await self._webhook(allowed_updates)
+            else:
+                await self._poll(allowed_updates)
+        finally:
+            monitor.cancel()
+            log.info("Stopping workers, routed=%s", self.routed)
+            await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
+
+async def run_sharded(cfg: Config, allowed_updates: list[str]) -> None:
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+    await Supervisor(cfg, cfg.workers).run(allowed_updates)
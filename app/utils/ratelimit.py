@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+# Ліміти Telegram Bot API (орієнтовно):
+# - ~30 повідомлень/сек на бота загалом
+# - ~1 повідомлення/сек в один чат (короткі сплески ок)
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3.0
+
+# бакети чатів, які давно не використовувались, прибираємо
+_CHAT_IDLE_TTL = 60.0
+_CHAT_PRUNE_EVERY = 1000
+
+
+class TokenBucket:
+    """
+    Token bucket з резервуванням: acquire() одразу списує токени (можна в мінус)
+    і спить рівно стільки, скільки треба, щоб борг відновився.
+    Черговість — FIFO, бо між читанням і записом нема await.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._ts = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Повертає, скільки секунд довелось чекати."""
+        self._refill(time.monotonic())
+        self._tokens -= tokens
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def idle_for(self, now: float) -> float:
+        """Скільки секунд бакет уже повний (0 — ще відновлюється)."""
+        self._refill(now)
+        if self._tokens < self.capacity:
+            return 0.0
+        return now - self._ts
+
+
+class RateLimiter:
+    """Глобальний бакет на бота + окремий бакет на кожен чат."""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, chat_burst: float = CHAT_BURST):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats: dict[int, TokenBucket] = {}
+        self._since_prune = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            self._since_prune += 1
+            if self._since_prune >= _CHAT_PRUNE_EVERY:
+                self._prune()
+        return bucket
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        self._chats = {cid: b for cid, b in self._chats.items() if b.idle_for(now) < _CHAT_IDLE_TTL}
+        self._since_prune = 0
+
+    async def acquire(self, chat_id: int | None, messages: int = 1) -> float:
+        """
+        Чекає на слот: спершу в чаті (1 запит), потім глобально (messages —
+        скільки повідомлень реально піде, напр. розмір альбому).
+        """
+        waited = 0.0
+        if chat_id is not None:
+            waited += await self._chat_bucket(chat_id).acquire(1)
+        waited += await self.global_bucket.acquire(messages)
+        return waited
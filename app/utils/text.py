@@ -1,13 +1,28 @@
-def cities_text(items: list[tuple[int, str, int]]) -> str:
-    # (city_id, name, points_count)
+def cities_text(items: list[dict]) -> str:
+    # locations_repo.list_cities_with_counts(): id, name, points, moves_out, moves_in
     if not items:
         return "Поки що міст нема. Додай через кнопку або /addcity."
     lines = ["🏙 <b>Міста:</b>"]
-    for _, name, cnt in items:
-        lines.append(f"• <b>{name}</b> — {cnt} ТТ")
+    for c in items:
+        line = f"• <b>{c['name']}</b> — {c['points']} ТТ"
+        if c.get("moves_out") or c.get("moves_in"):
+            line += f" • 🟢 📤 {c['moves_out']} / 📥 {c['moves_in']}"
+        lines.append(line)
+    if any(c.get("moves_out") or c.get("moves_in") for c in items):
+        lines.append("\n🟢 активні переміщення: 📤 з міста / 📥 у місто")
     return "\n".join(lines)
 
 
+def attachments_badge(m: dict) -> str:
+    """Короткий підсумок вкладень для рядка списку: " 📷3 📄" (порожньо, якщо нема нічого)."""
+    badge = ""
+    if m.get("invoice_photos_count"):
+        badge += f" 📷{m['invoice_photos_count']}"
+    if m.get("invoice_pdf_file_id"):
+        badge += " 📄"
+    return badge
+
+
 def move_text(m: dict) -> str:
     from_part = "—" if not m.get("from_point_name") else f"{m.get('from_city_name','?')} / {m.get('from_point_name')}"
     to_part = "—" if not m.get("to_point_name") else f"{m.get('to_city_name','?')} / {m.get('to_point_name')}"
@@ -25,7 +40,7 @@ def move_text(m: dict) -> str:
     # --- attachments summary ---
     pdf_ok = bool(m.get("invoice_pdf_file_id"))
 
-    # якщо десь підкладемо invoice_photos_count — покажемо точно
+    # moves.invoice_photos_count — фото поточної версії (колонка, без окремого запиту)
     photos_count = m.get("invoice_photos_count")
     if isinstance(photos_count, int):
         photos_line = f"📷 Фото накладної: <b>{photos_count}</b>"
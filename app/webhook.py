@@ -0,0 +1,65 @@
+# app/webhook.py
+"""
+Webhook-режим (RUN_MODE=webhook): вбудований aiohttp-сервер замість long polling.
+
+- POST {WEBHOOK_PATH} — апдейти від Telegram; заголовок
+  X-Telegram-Bot-Api-Secret-Token звіряється з WEBHOOK_SECRET
+- WEBHOOK_BACKGROUND=1 — апдейт обробляється у фоновій задачі, Telegram
+  одразу отримує 200 (інакше відповідь чекає хендлер)
+- GET /healthz — для балансувальника
+- WEBHOOK_URL порожній — setWebhook не робимо: зручно локально, просто
+  POST-имо записаний Update JSON:
+    curl -X POST localhost:8080/webhook -H 'Content-Type: application/json' \
+         -H 'X-Telegram-Bot-Api-Secret-Token: <secret>' -d @update.json
+"""
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from .config import Config
+
+log = logging.getLogger(__name__)
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def build_app(cfg: Config, bot: Bot, dp: Dispatcher) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=cfg.webhook_background,
+        secret_token=cfg.webhook_secret or None,
+    ).register(app, path=cfg.webhook_path)
+    app.router.add_get("/healthz", _healthz)
+    # startup/shutdown dispatcher-а (outbox, меню команд) — разом з життєвим циклом app
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(cfg: Config, bot: Bot, dp: Dispatcher) -> None:
+    runner = web.AppRunner(build_app(cfg, bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.webhook_host, cfg.webhook_port)
+    await site.start()
+    log.info("Webhook server on http://%s:%s%s", cfg.webhook_host, cfg.webhook_port, cfg.webhook_path)
+
+    try:
+        if cfg.webhook_url:
+            await bot.set_webhook(
+                url=cfg.webhook_url + cfg.webhook_path,
+                secret_token=cfg.webhook_secret or None,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            log.info("Webhook set: %s%s", cfg.webhook_url, cfg.webhook_path)
+        else:
+            log.warning("WEBHOOK_URL is empty: setWebhook skipped (local mode)")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()